@@ -0,0 +1,278 @@
+"""
+Action steps shared by the batch endpoint and other command channels.
+
+A step is a dict naming one of the existing REST actions plus that route's
+parameters, e.g. {"action": "duo", "key1": "ctrl", "key2": "c"} or
+{"action": "volume/set", "app": "chrome.exe", "volume": 0.5}. The extra
+"wait" action pauses for {"ms": 100}.
+
+validate_bulk_op() checks the operations of /api/volume/bulk; fade_options() checks
+the "duration_ms" and "curve" of anything that fades.
+"""
+
+import time
+import volume_controller
+from keyboard_simulator import DEFAULT_COMBO_HOLD, TYPE_MODES, check_typing_rate, clipboard_usable
+
+# Upper bound for a single "wait" step (milliseconds)
+MAX_WAIT_MS = 10000
+
+# Upper bound for "hold_ms" on a "down" step (milliseconds)
+MAX_HOLD_MS = 60000
+
+# Key actions and the key parameters each one takes, in press order
+KEY_ACTIONS = {
+    'single': ('key',),
+    'duo': ('key1', 'key2'),
+    'trio': ('key1', 'key2', 'key3'),
+    'quartet': ('key1', 'key2', 'key3', 'key4'),
+    'down': ('key',),
+    'up': ('key',),
+}
+
+# Per-app volume actions (identified by "app" or "pid")
+APP_VOLUME_ACTIONS = (
+    'volume/get', 'volume/set', 'volume/up', 'volume/down',
+    'volume/mute', 'volume/unmute', 'volume/toggle-mute',
+)
+
+# Master volume actions
+MASTER_VOLUME_ACTIONS = (
+    'volume/master', 'volume/master/set', 'volume/master/up', 'volume/master/down',
+    'volume/master/mute', 'volume/master/unmute', 'volume/master/toggle-mute',
+)
+
+# Operations accepted by /api/volume/bulk, and the selectors that pick their targets
+BULK_OPS = ('set', 'delta', 'mute', 'unmute', 'toggle')
+BULK_SELECTORS = ('app', 'pid', 'master', 'all_except')
+
+# Upper bound for the number of operations in one bulk request
+MAX_BULK_OPS = 200
+
+ACTIONS = tuple(KEY_ACTIONS) + ('combo', 'string', 'wait', 'volume/fade') + APP_VOLUME_ACTIONS + MASTER_VOLUME_ACTIONS
+
+
+class ActionError(ValueError):
+    """Raised when a step is malformed or cannot be carried out."""
+
+
+def _identifier(step):
+    """Return the app name or PID a volume step targets."""
+    identifier = step.get('pid') if 'pid' in step else step.get('app')
+    if identifier is None:
+        raise ActionError('Either "app" (process name) or "pid" is required')
+    if 'pid' in step:
+        try:
+            identifier = int(identifier)
+        except (TypeError, ValueError):
+            raise ActionError('pid must be an integer')
+    return identifier
+
+
+def _number(step, field, default=None):
+    """Return step[field] as a float, or default when absent."""
+    if field not in step:
+        if default is None:
+            raise ActionError(f'"{field}" is required')
+        return default
+    try:
+        return float(step[field])
+    except (TypeError, ValueError):
+        raise ActionError(f'"{field}" must be a number')
+
+
+def fade_options(step, required=True):
+    """Check "duration_ms" and "curve" of a fading step. Returns (duration seconds, curve)."""
+    if not required and 'duration_ms' not in step:
+        return None, None
+    duration_ms = _number(step, 'duration_ms')
+    if duration_ms < 0 or duration_ms > volume_controller.MAX_FADE_DURATION * 1000:
+        raise ActionError(f'"duration_ms" must be between 0 and {int(volume_controller.MAX_FADE_DURATION * 1000)}')
+    curve = step.get('curve', 'linear')
+    if curve not in volume_controller.FADE_CURVES:
+        raise ActionError(f'"curve" must be one of: {", ".join(volume_controller.FADE_CURVES)}')
+    return duration_ms / 1000.0, curve
+
+
+def validate(step, simulator):
+    """
+    Check one step without executing it.
+    Raises ActionError describing the first problem found.
+    """
+    if not isinstance(step, dict):
+        raise ActionError('Each step must be an object')
+    action = step.get('action')
+    if action not in ACTIONS:
+        raise ActionError(f'Unknown action: {action}')
+
+    if action in KEY_ACTIONS:
+        for field in KEY_ACTIONS[action]:
+            if field not in step:
+                raise ActionError(f'"{field}" is required for {action}')
+            if not isinstance(step[field], str) or not simulator.normalize_key(step[field]):
+                raise ActionError(f'Invalid key: {step[field]}')
+        if action == 'down' and step.get('hold_ms') is not None:
+            hold_ms = _number(step, 'hold_ms')
+            if hold_ms < 0 or hold_ms > MAX_HOLD_MS:
+                raise ActionError(f'"hold_ms" must be between 0 and {MAX_HOLD_MS}')
+    elif action == 'combo':
+        keys = step.get('hotkey', step.get('keys'))
+        if not isinstance(keys, (str, list)):
+            raise ActionError('"keys" (list) or "hotkey" (string) is required for combo')
+        hold_ms = _number(step, 'hold_ms', DEFAULT_COMBO_HOLD * 1000)
+        if hold_ms < 0 or hold_ms > MAX_HOLD_MS:
+            raise ActionError(f'"hold_ms" must be between 0 and {MAX_HOLD_MS}')
+        try:
+            simulator.compile_combo(keys if isinstance(keys, str) else tuple(keys), hold_ms / 1000.0)
+        except (TypeError, ValueError) as e:
+            raise ActionError(str(e))
+    elif action == 'string':
+        text = step.get('text')
+        if not text or not isinstance(text, str):
+            raise ActionError('Text parameter must be a non-empty string')
+        if step.get('mode', 'auto') not in TYPE_MODES:
+            raise ActionError(f'"mode" must be one of: {", ".join(TYPE_MODES)}')
+        if step.get('mode') == 'paste' and not clipboard_usable():
+            raise ActionError('Paste mode needs a working clipboard')
+        if step.get('cps') is not None:
+            try:
+                check_typing_rate(text, _number(step, 'cps'))
+            except ValueError as e:
+                raise ActionError(str(e))
+    elif action == 'wait':
+        ms = _number(step, 'ms')
+        if ms < 0 or ms > MAX_WAIT_MS:
+            raise ActionError(f'"ms" must be between 0 and {MAX_WAIT_MS}')
+    else:
+        if not volume_controller.is_available():
+            raise ActionError('Volume control is not available (Windows + pycaw required)')
+        retry_after = volume_controller.retry_after()
+        if retry_after is not None:
+            raise ActionError(f'Audio backend is not responding; retry in {retry_after}s')
+        if action in APP_VOLUME_ACTIONS or (action == 'volume/fade' and step.get('master') is not True):
+            _identifier(step)
+        if action == 'volume/fade':
+            _number(step, 'volume')
+            fade_options(step)
+        if action in ('volume/set', 'volume/master/set'):
+            _number(step, 'volume')
+        if action.endswith('/up') or action.endswith('/down'):
+            _number(step, 'amount', volume_controller.DEFAULT_VOLUME_STEP)
+
+
+def validate_bulk_op(op):
+    """
+    Check one /api/volume/bulk operation, e.g. {"op": "set", "app": "chrome.exe", "volume": 0.5}
+    or {"op": "mute", "all_except": ["discord.exe"]}. A "set" may fade with "duration_ms" and
+    "curve". Raises ActionError.
+    """
+    if not isinstance(op, dict):
+        raise ActionError('Each operation must be an object')
+    if op.get('op') not in BULK_OPS:
+        raise ActionError(f'"op" must be one of: {", ".join(BULK_OPS)}')
+    selectors = [field for field in BULK_SELECTORS if field in op]
+    if len(selectors) != 1:
+        raise ActionError('Exactly one of "app", "pid", "master" or "all_except" is required')
+    if selectors[0] in ('app', 'pid'):
+        _identifier(op)
+    elif selectors[0] == 'master':
+        if op['master'] is not True:
+            raise ActionError('"master" must be true')
+    else:
+        excluded = op['all_except']
+        if not isinstance(excluded, list) or not all(isinstance(item, (str, int)) for item in excluded):
+            raise ActionError('"all_except" must be a list of app names and/or PIDs')
+    if op['op'] == 'set':
+        _number(op, 'volume')
+        fade_options(op, required=False)
+    elif op['op'] == 'delta':
+        _number(op, 'amount')
+
+
+def run(step, simulator):
+    """
+    Execute one validated step.
+    Returns a result dict ({"success": True, "message": ...} plus any values read).
+    Raises ActionError if a volume target is not found or the call fails.
+    """
+    action = step['action']
+
+    if action == 'down' and step.get('hold_ms') is not None:
+        simulator.down(step['key'], hold=_number(step, 'hold_ms') / 1000.0)
+        return {'success': True, 'message': f'down: {step["key"]} (release in {step["hold_ms"]}ms)'}
+    if action in KEY_ACTIONS:
+        keys = [step[field] for field in KEY_ACTIONS[action]]
+        getattr(simulator, action)(*keys)
+        return {'success': True, 'message': f'{action}: {" + ".join(keys)}'}
+    if action == 'combo':
+        keys = step.get('hotkey', step.get('keys'))
+        simulator.combo(keys, hold=_number(step, 'hold_ms', DEFAULT_COMBO_HOLD * 1000) / 1000.0)
+        label = keys if isinstance(keys, str) else ' + '.join(keys)
+        return {'success': True, 'message': f'combo: {label}'}
+    if action == 'string':
+        cps = _number(step, 'cps') if step.get('cps') is not None else None
+        mode = simulator.type_string(step['text'], mode=step.get('mode', 'auto'), cps=cps)
+        return {'success': True, 'message': f'Typed {len(step["text"])} character(s)', 'mode': mode}
+    if action == 'wait':
+        time.sleep(_number(step, 'ms') / 1000.0)
+        return {'success': True, 'message': f'Waited {step["ms"]}ms'}
+
+    if action == 'volume/fade':
+        duration, curve = fade_options(step)
+        if step.get('master') is True:
+            success, message = volume_controller.fade_master(step['volume'], duration, curve)
+        else:
+            success, message = volume_controller.fade(_identifier(step), step['volume'], duration, curve)
+        if not success:
+            raise ActionError(message)
+        return {'success': True, 'message': message}
+
+    if action in APP_VOLUME_ACTIONS:
+        identifier = _identifier(step)
+        if action == 'volume/get':
+            info = volume_controller.get_volume(identifier)
+            if info is None:
+                raise ActionError(f'App not found: {identifier}')
+            return dict(info, success=True)
+        if action == 'volume/toggle-mute':
+            success, message, muted = volume_controller.toggle_mute(identifier)
+            if not success:
+                raise ActionError(message)
+            return {'success': True, 'message': message, 'muted': muted}
+        if action == 'volume/set':
+            success, message = volume_controller.set_volume(identifier, step['volume'])
+        elif action == 'volume/up':
+            success, message = volume_controller.volume_up(identifier, _number(step, 'amount', volume_controller.DEFAULT_VOLUME_STEP))
+        elif action == 'volume/down':
+            success, message = volume_controller.volume_down(identifier, _number(step, 'amount', volume_controller.DEFAULT_VOLUME_STEP))
+        elif action == 'volume/mute':
+            success, message = volume_controller.mute(identifier)
+        else:
+            success, message = volume_controller.unmute(identifier)
+        if not success:
+            raise ActionError(message)
+        return {'success': True, 'message': message}
+
+    if action == 'volume/master':
+        info = volume_controller.get_master_volume()
+        if info is None:
+            raise ActionError('Master volume not available')
+        return dict(info, success=True)
+    if action == 'volume/master/toggle-mute':
+        success, message, muted = volume_controller.toggle_master_mute()
+        if not success:
+            raise ActionError(message)
+        return {'success': True, 'message': message, 'muted': muted}
+    if action == 'volume/master/set':
+        success, message = volume_controller.set_master_volume(step['volume'])
+    elif action == 'volume/master/up':
+        success, message = volume_controller.master_volume_up(_number(step, 'amount', volume_controller.DEFAULT_VOLUME_STEP))
+    elif action == 'volume/master/down':
+        success, message = volume_controller.master_volume_down(_number(step, 'amount', volume_controller.DEFAULT_VOLUME_STEP))
+    elif action == 'volume/master/mute':
+        success, message = volume_controller.master_mute()
+    else:
+        success, message = volume_controller.master_unmute()
+    if not success:
+        raise ActionError(message)
+    return {'success': True, 'message': message}
@@ -0,0 +1,1115 @@
+"""
+Audio backends for volume_controller.
+
+A backend lists audio sessions, reads and writes session and master volume,
+reads peak meters of many sessions in one call, lists playback/recording
+devices (switching the default and reading/writing a device's volume), and
+can report changes (sessions appearing or expiring, volume/mute changes)
+to a listener so volume_controller can keep a live model instead of polling.
+
+PycawBackend talks to Windows Core Audio through pycaw. FakeAudioBackend keeps
+everything in memory and emits the same events, so the volume API can be
+exercised on any OS. It can simulate many sessions, a per-call latency and
+failing calls, so volume paths can be benchmarked on Linux with COM-like costs.
+create_backend() builds either from a spec string such as
+"fake:sessions=200,latency_ms=1". GuardedBackend wraps either in a circuit
+breaker so a wedged audio stack fails fast instead of tying up callers.
+"""
+
+import sys
+import math
+import time
+import queue
+import random
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import metrics
+from circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+# Events passed to the listener registered with start_notifications(): listener(event, payload)
+SESSION_ADDED = 'session_added'        # payload: AudioSession
+SESSION_REMOVED = 'session_removed'    # payload: session key
+SESSION_CHANGED = 'session_changed'    # payload: (session key, volume, muted)
+MASTER_CHANGED = 'master_changed'      # payload: (volume, muted)
+DEFAULT_DEVICE_CHANGED = 'default_device_changed'  # payload: new device id; sessions and master now refer to it
+BACKEND_RECOVERED = 'backend_recovered'  # payload: None; calls work again after the breaker was open
+DEVICES_CHANGED = 'devices_changed'    # payload: None; a device was added/removed/enabled/disabled or a default changed
+
+# Device data-flow directions as reported by list_devices()
+DEVICE_FLOWS = ('render', 'capture')
+
+# Longest wait for one call on the COM worker before it counts as failed (seconds)
+COM_CALL_TIMEOUT = 10.0
+
+_pycaw_available = False
+_callbacks_available = False
+try:
+    if sys.platform == "win32":
+        import comtypes
+        import psutil
+        from pycaw.pycaw import AudioUtilities, IAudioMeterInformation, IAudioEndpointVolume
+        from pycaw.constants import DEVICE_STATE, EDataFlow, ERole
+        _pycaw_available = True
+        from pycaw.callbacks import (AudioSessionNotification, AudioSessionEvents, AudioEndpointVolumeCallback,
+                                      MMNotificationClient)
+        _callbacks_available = True
+except ImportError:
+    pass
+
+
+class AudioSession:
+    """
+    One audio session.
+    key: unique id for the session's lifetime; pid: process id (0 for system sounds);
+    name: process name ("System" for system sounds).
+    """
+    key = None
+    pid = 0
+    name = "Unknown"
+
+    def get_volume(self):
+        raise NotImplementedError
+
+    def set_volume(self, level):
+        raise NotImplementedError
+
+    def get_mute(self):
+        raise NotImplementedError
+
+    def set_mute(self, muted):
+        raise NotImplementedError
+
+
+class AudioBackend:
+    """Interface used by volume_controller. Methods raise on failure."""
+    name = 'none'
+
+    def is_available(self):
+        return False
+
+    def list_sessions(self):
+        """Return a list of AudioSession."""
+        raise NotImplementedError
+
+    def get_master(self):
+        """Return (volume 0.0-1.0, muted) for the default playback device."""
+        raise NotImplementedError
+
+    def set_master_volume(self, level):
+        raise NotImplementedError
+
+    def set_master_mute(self, muted):
+        raise NotImplementedError
+
+    def read_peaks(self, sessions):
+        """
+        Read the current peak level (0.0-1.0) of sessions (from list_sessions) and
+        of the default playback device in one call.
+        Returns ({session key: peak}, master peak); sessions that can't be read are left out.
+        """
+        raise NotImplementedError
+
+    def list_devices(self):
+        """
+        Return (devices, defaults) for active devices: devices is a list of
+        {"id", "name", "flow"} (flow "render" or "capture"); defaults maps each flow
+        to the id of its default device (or None).
+        """
+        raise NotImplementedError
+
+    def set_default_device(self, device_id):
+        """Make device_id the default device for its flow (console and multimedia roles)."""
+        raise NotImplementedError
+
+    def get_device_volume(self, device_id):
+        """Return (volume 0.0-1.0, muted) of a device's endpoint."""
+        raise NotImplementedError
+
+    def set_device_volume(self, device_id, level):
+        raise NotImplementedError
+
+    def set_device_mute(self, device_id, muted):
+        raise NotImplementedError
+
+    def start_notifications(self, listener):
+        """
+        Start reporting changes to listener(event, payload).
+        Returns True if events will be delivered, False if the caller has to poll.
+        """
+        return False
+
+
+# --- Windows Core Audio (pycaw) ---
+
+class ComWorker:
+    """
+    One long-lived thread that initializes COM once (multithreaded apartment)
+    and runs every audio call. Callers queue a function and wait on a Future,
+    so COM objects are created and used on one thread and calls are serialized.
+    """
+    def __init__(self, name='audio-com'):
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        """Queue fn(*args) for the worker thread. Returns a Future with its result."""
+        future = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name=self.name)
+                self._thread.start()
+        self._queue.put((fn, args, future, time.perf_counter()))
+        return future
+
+    def call(self, fn, *args):
+        """
+        Run fn(*args) on the worker thread and return its result (or raise its exception).
+        Raises TimeoutError if it doesn't finish within COM_CALL_TIMEOUT; the call is
+        then cancelled so it doesn't run late if it is still queued.
+        """
+        if threading.current_thread() is self._thread:
+            return fn(*args)
+        future = self.submit(fn, *args)
+        try:
+            return future.result(timeout=COM_CALL_TIMEOUT)
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Audio call {getattr(fn, '__name__', fn)} took longer than {COM_CALL_TIMEOUT:g}s")
+
+    def _run(self):
+        with metrics.timed('com_initialize'):
+            comtypes.CoInitializeEx(comtypes.COINIT_MULTITHREADED)
+        while True:
+            fn, args, future, queued = self._queue.get()
+            metrics.observe_stage('audio_queue_wait', time.perf_counter() - queued)
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+class EventDispatcher:
+    """
+    Delivers backend events to a listener in order on its own thread. The
+    listener may take locks that other threads hold while they wait on the
+    COM worker, so it must never run on the worker itself.
+    """
+    def __init__(self, name='audio-events'):
+        self.listener = None
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True, name=name)
+        self._thread.start()
+
+    def __call__(self, event, payload):
+        self._queue.put((event, payload))
+
+    def _run(self):
+        while True:
+            event, payload = self._queue.get()
+            listener = self.listener
+            if listener is None:
+                continue
+            try:
+                listener(event, payload)
+            except Exception as e:
+                logger.debug("Audio event listener failed: %s", e)
+
+
+class ProcessNameCache:
+    """
+    PID -> process name, validated by process creation time so a reused PID is
+    never given an old name.
+
+    Trust is tied to session instances, not PIDs: an entry vouches for the
+    sessions it was verified for, and only those get its name without a
+    process query. A session the cache hasn't seen (even one whose PID is
+    already listed, e.g. after the old process exited and its session lingers)
+    costs one creation-time check; the name is resolved again only if the PID
+    now belongs to another process. Sessions that leave the listing stop
+    vouching, entries whose PID stays absent are evicted, and the cache never
+    holds more than max_size entries.
+    """
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._entries = OrderedDict()   # pid -> {"created", "name", "sessions": vouched session keys, "absent"}
+        self._lock = threading.Lock()
+
+    def name(self, pid, session_key=None):
+        """Return the process name for pid ("PID <n>" if it can't be read) as seen by session_key."""
+        with self._lock:
+            entry = self._entries.get(pid)
+            if entry is not None:
+                self._entries.move_to_end(pid)
+                if session_key is not None and session_key in entry["sessions"]:
+                    return entry["name"]
+        try:
+            with metrics.timed('process_verify'):
+                process = psutil.Process(pid)
+                created = process.create_time()
+            if entry is not None and entry["created"] == created:
+                name = entry["name"]
+            else:
+                with metrics.timed('process_name'):
+                    name = process.name()
+        except Exception:
+            self.forget(pid)
+            return f"PID {pid}"
+        with self._lock:
+            current = self._entries.get(pid)
+            sessions = current["sessions"] if current is not None and current["created"] == created else set()
+            # A PID-only key can't tell a reused PID's session from the old one
+            if session_key is not None and not session_key.startswith("pid:"):
+                sessions.add(session_key)
+            self._entries[pid] = {"created": created, "name": name, "sessions": sessions, "absent": False}
+            self._entries.move_to_end(pid)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return name
+
+    def untrust(self, pid, session_key):
+        """The session went away; it no longer vouches for the PID's name."""
+        with self._lock:
+            entry = self._entries.get(pid)
+            if entry is not None:
+                entry["sessions"].discard(session_key)
+
+    def forget(self, pid):
+        with self._lock:
+            self._entries.pop(pid, None)
+
+    def seen(self, sessions):
+        """
+        Record a full session listing ({pid: set of session keys}): sessions no
+        longer listed stop vouching, and an entry whose PID is absent from two
+        listings in a row is evicted.
+        """
+        with self._lock:
+            for pid, entry in list(self._entries.items()):
+                listed = sessions.get(pid)
+                if listed is not None:
+                    entry["sessions"] &= listed
+                    entry["absent"] = False
+                elif entry["absent"]:
+                    del self._entries[pid]
+                else:
+                    entry["sessions"] = set()
+                    entry["absent"] = True
+
+
+def _session_key(session):
+    """Stable id for a pycaw session (its instance identifier, or the PID as a fallback)."""
+    try:
+        return session.InstanceIdentifier
+    except Exception:
+        return f"pid:{getattr(session, 'ProcessId', 0) or 0}"
+
+
+class PycawSession(AudioSession):
+    """AudioSession backed by a pycaw AudioSession. Created on, and called through, the COM worker."""
+
+    def __init__(self, session, worker, names):
+        self._session = session
+        self._worker = worker
+        self._volume = session.SimpleAudioVolume
+        self._meter = None
+        self.pid = getattr(session, "ProcessId", None) or 0
+        self.key = _session_key(session)
+        # Sessions without a process are system sounds
+        self.name = names.name(self.pid, self.key) if self.pid else "System"
+
+    def _get_volume(self):
+        with metrics.timed('com_session_get'):
+            return self._volume.GetMasterVolume()
+
+    def _set_volume(self, level):
+        with metrics.timed('com_session_set'):
+            self._volume.SetMasterVolume(level, None)
+
+    def _get_mute(self):
+        with metrics.timed('com_session_get'):
+            return bool(self._volume.GetMute())
+
+    def _set_mute(self, muted):
+        with metrics.timed('com_session_set'):
+            self._volume.SetMute(1 if muted else 0, None)
+
+    def _get_peak(self):
+        if self._meter is None:
+            self._meter = self._session._ctl.QueryInterface(IAudioMeterInformation)
+        return self._meter.GetPeakValue()
+
+    def get_volume(self):
+        return self._worker.call(self._get_volume)
+
+    def set_volume(self, level):
+        self._worker.call(self._set_volume, level)
+
+    def get_mute(self):
+        return self._worker.call(self._get_mute)
+
+    def set_mute(self, muted):
+        self._worker.call(self._set_mute, muted)
+
+
+if _callbacks_available:
+    class _SessionCreated(AudioSessionNotification):
+        def __init__(self, backend, listener):
+            super().__init__()
+            self._backend = backend
+            self._listener = listener
+
+        def on_session_created(self, new_session):
+            # Hand the new session to the COM worker; don't block the notification thread
+            self._backend._worker.submit(self._backend._session_created, new_session, self._listener)
+
+    class _SessionEvents(AudioSessionEvents):
+        def __init__(self, key, pid, names, listener):
+            super().__init__()
+            self._key = key
+            self._pid = pid
+            self._names = names
+            self._listener = listener
+
+        def on_simple_volume_changed(self, new_volume, new_mute, event_context):
+            self._listener(SESSION_CHANGED, (self._key, new_volume, bool(new_mute)))
+
+        def _removed(self):
+            self._names.untrust(self._pid, self._key)
+            self._listener(SESSION_REMOVED, self._key)
+
+        def on_state_changed(self, new_state, new_state_id):
+            if new_state == "Expired":
+                self._removed()
+
+        def on_session_disconnected(self, disconnect_reason, disconnect_reason_id):
+            self._removed()
+
+    class _MasterVolumeChanged(AudioEndpointVolumeCallback):
+        def __init__(self, listener):
+            super().__init__()
+            self._listener = listener
+
+        def on_notify(self, new_volume, new_mute, event_context, channels, channel_volumes):
+            self._listener(MASTER_CHANGED, (new_volume, bool(new_mute)))
+
+    class _DeviceChanged(MMNotificationClient):
+        def __init__(self, backend):
+            super().__init__()
+            self._backend = backend
+
+        def on_default_device_changed(self, flow, flow_id, role, role_id, default_device_id):
+            # GetSpeakers() resolves the multimedia render device
+            if flow == "eRender" and role == "eMultimedia":
+                self._backend._worker.submit(self._backend._default_device_changed, default_device_id)
+            self._backend._worker.submit(self._backend._devices_changed)
+
+        def on_device_added(self, added_device_id):
+            self._backend._worker.submit(self._backend._devices_changed)
+
+        def on_device_removed(self, removed_device_id):
+            self._backend._worker.submit(self._backend._devices_changed)
+
+        def on_device_state_changed(self, device_id, new_state, new_state_id):
+            self._backend._worker.submit(self._backend._devices_changed)
+
+
+class PycawBackend(AudioBackend):
+    """Windows Core Audio through pycaw. All COM work runs on one ComWorker thread."""
+    name = 'pycaw'
+
+    def __init__(self):
+        self._worker = ComWorker()
+        self._names = ProcessNameCache()
+        self._callbacks = []
+        # Events are handed to _dispatcher rather than called on the worker; see EventDispatcher
+        self._listener = None
+        self._dispatcher = None
+        # Cached master endpoint (IAudioEndpointVolume) and meter; only touched on the worker thread
+        self._endpoint = None
+        self._meter = None
+        self._master_callback = None
+        self._enumerator = None
+        self._device_watch = None
+        # Endpoint volume per device id, cached like the master endpoint
+        self._device_endpoints = {}
+
+    def is_available(self):
+        return _pycaw_available
+
+    def _list_sessions(self):
+        with metrics.timed('com_get_all_sessions'):
+            sessions = AudioUtilities.GetAllSessions()
+        wrapped = [PycawSession(session, self._worker, self._names) for session in sessions]
+        listed = {}
+        for session in wrapped:
+            listed.setdefault(session.pid, set()).add(session.key)
+        self._names.seen(listed)
+        return wrapped
+
+    def list_sessions(self):
+        return self._worker.call(self._list_sessions)
+
+    def _device_enumerator(self):
+        if self._enumerator is None:
+            self._enumerator = AudioUtilities.GetDeviceEnumerator()
+        return self._enumerator
+
+    def _watch_devices(self):
+        """Register for device and default device changes (once). Returns True if changes will be reported."""
+        if self._device_watch is None and _callbacks_available:
+            try:
+                watch = _DeviceChanged(self)
+                self._device_enumerator().RegisterEndpointNotificationCallback(watch)
+                self._device_watch = watch
+            except Exception as e:
+                logger.debug("Device change registration failed: %s", e)
+        return self._device_watch is not None
+
+    def _master_endpoint(self):
+        """
+        Endpoint volume of the default playback device. Cached until the default
+        device changes or a call on it fails; looked up on every call if device
+        changes can't be observed.
+        """
+        if self._endpoint is not None:
+            return self._endpoint
+        with metrics.timed('com_get_speakers'):
+            endpoint = AudioUtilities.GetSpeakers().EndpointVolume
+        if self._watch_devices():
+            self._endpoint = endpoint
+        return endpoint
+
+    def _list_devices(self):
+        self._watch_devices()
+        devices = []
+        defaults = {}
+        with metrics.timed('com_list_devices'):
+            for flow, data_flow in (('render', EDataFlow.eRender), ('capture', EDataFlow.eCapture)):
+                for device in AudioUtilities.GetAllDevices(data_flow.value, DEVICE_STATE.ACTIVE.value):
+                    devices.append({"id": device.id, "name": device.FriendlyName or device.id, "flow": flow})
+                try:
+                    default = self._device_enumerator().GetDefaultAudioEndpoint(data_flow.value, ERole.eMultimedia.value)
+                    defaults[flow] = default.GetId()
+                except Exception:
+                    # No active device for this flow
+                    defaults[flow] = None
+        return devices, defaults
+
+    def list_devices(self):
+        return self._worker.call(self._list_devices)
+
+    def _set_default_device(self, device_id):
+        if not hasattr(AudioUtilities, 'SetDefaultDevice'):
+            raise RuntimeError("Switching the default device needs a newer pycaw (20251023 or later)")
+        with metrics.timed('com_set_default_device'):
+            AudioUtilities.SetDefaultDevice(device_id, [ERole.eConsole, ERole.eMultimedia])
+
+    def set_default_device(self, device_id):
+        self._worker.call(self._set_default_device, device_id)
+
+    def _device_call(self, device_id, fn):
+        """Run fn(endpoint) on a device's endpoint volume; the cached endpoint is dropped if it fails."""
+        endpoint = self._device_endpoints.get(device_id)
+        if endpoint is None:
+            with metrics.timed('com_get_device'):
+                device = self._device_enumerator().GetDevice(device_id)
+                endpoint = device.Activate(IAudioEndpointVolume._iid_, comtypes.CLSCTX_ALL, None)
+                endpoint = endpoint.QueryInterface(IAudioEndpointVolume)
+            if self._watch_devices():
+                self._device_endpoints[device_id] = endpoint
+        try:
+            return fn(endpoint)
+        except Exception:
+            self._device_endpoints.pop(device_id, None)
+            raise
+
+    def get_device_volume(self, device_id):
+        def read(ep):
+            with metrics.timed('com_device_get'):
+                return ep.GetMasterVolumeLevelScalar(), bool(ep.GetMute())
+        return self._worker.call(self._device_call, device_id, read)
+
+    def set_device_volume(self, device_id, level):
+        def write(ep):
+            with metrics.timed('com_device_set'):
+                ep.SetMasterVolumeLevelScalar(level, None)
+        self._worker.call(self._device_call, device_id, write)
+
+    def set_device_mute(self, device_id, muted):
+        def write(ep):
+            with metrics.timed('com_device_set'):
+                ep.SetMute(1 if muted else 0, None)
+        self._worker.call(self._device_call, device_id, write)
+
+    def _devices_changed(self):
+        """Drop cached device endpoints and tell the listener the device list changed."""
+        self._device_endpoints = {}
+        if self._listener is not None:
+            self._listener(DEVICES_CHANGED, None)
+
+    def _master_meter(self):
+        """Peak meter of the default playback device, cached like _master_endpoint()."""
+        if self._meter is not None:
+            return self._meter
+        with metrics.timed('com_get_speakers'):
+            device = AudioUtilities.GetSpeakers()
+            meter = device._dev.Activate(IAudioMeterInformation._iid_, comtypes.CLSCTX_ALL, None)
+            meter = meter.QueryInterface(IAudioMeterInformation)
+        if self._watch_devices():
+            self._meter = meter
+        return meter
+
+    def _read_peaks(self, sessions):
+        peaks = {}
+        with metrics.timed('com_meter_read'):
+            for session in sessions:
+                try:
+                    peaks[session.key] = session._get_peak()
+                except Exception as e:
+                    logger.debug("Session peak read failed: %s", e)
+            try:
+                master = self._master_meter().GetPeakValue()
+            except Exception as e:
+                logger.debug("Master peak read failed: %s", e)
+                self._meter = None
+                master = None
+        return peaks, master
+
+    def read_peaks(self, sessions):
+        # One worker job for the whole pass, however many sessions there are
+        return self._worker.call(self._read_peaks, sessions)
+
+    def _master_call(self, fn):
+        """Run fn(endpoint); if it fails on the cached endpoint, look the device up again and retry once."""
+        cached = self._endpoint is not None
+        try:
+            return fn(self._master_endpoint())
+        except Exception:
+            self._endpoint = None
+            if not cached:
+                raise
+        return fn(self._master_endpoint())
+
+    def _get_master(self):
+        def read(ep):
+            with metrics.timed('com_master_get'):
+                return ep.GetMasterVolumeLevelScalar(), bool(ep.GetMute())
+        return self._master_call(read)
+
+    def _set_master_volume(self, level):
+        def write(ep):
+            with metrics.timed('com_master_set'):
+                ep.SetMasterVolumeLevelScalar(level, None)
+        self._master_call(write)
+
+    def _set_master_mute(self, muted):
+        def write(ep):
+            with metrics.timed('com_master_set'):
+                ep.SetMute(1 if muted else 0, None)
+        self._master_call(write)
+
+    def _default_device_changed(self, device_id):
+        """Drop the cached endpoint and move notifications to the new default device."""
+        old, self._endpoint = self._endpoint, None
+        self._meter = None
+        if old is not None and self._master_callback is not None:
+            try:
+                old.UnregisterControlChangeNotify(self._master_callback)
+            except Exception as e:
+                logger.debug("Master notification unregistration failed: %s", e)
+        self._master_callback = None
+        if self._listener is None:
+            return
+        try:
+            self._register_notifications(self._listener)
+        except Exception as e:
+            logger.warning("Could not register notifications on the new default device: %s", e)
+        self._listener(DEFAULT_DEVICE_CHANGED, device_id)
+
+    def get_master(self):
+        return self._worker.call(self._get_master)
+
+    def set_master_volume(self, level):
+        self._worker.call(self._set_master_volume, level)
+
+    def set_master_mute(self, muted):
+        self._worker.call(self._set_master_mute, muted)
+
+    def _watch_session(self, session, listener):
+        """Subscribe to volume/state events of one pycaw session."""
+        try:
+            pid = getattr(session, "ProcessId", None) or 0
+            callback = _SessionEvents(_session_key(session), pid, self._names, listener)
+            session.register_notification(callback)
+            self._callbacks.append(callback)
+        except Exception as e:
+            logger.debug("Session notification registration failed: %s", e)
+
+    def _session_created(self, session, listener):
+        self._watch_session(session, listener)
+        listener(SESSION_ADDED, PycawSession(session, self._worker, self._names))
+
+    def _register_notifications(self, listener):
+        manager = AudioUtilities.GetAudioSessionManager()
+        created = _SessionCreated(self, listener)
+        manager.RegisterSessionNotification(created)
+        self._callbacks.append(created)
+        # Session notifications only start after the first enumeration
+        manager.GetSessionEnumerator()
+        for session in AudioUtilities.GetAllSessions():
+            self._watch_session(session, listener)
+        master = _MasterVolumeChanged(listener)
+        self._master_endpoint().RegisterControlChangeNotify(master)
+        self._master_callback = master
+
+    def _start_notifications(self, listener):
+        self._register_notifications(listener)
+        self._listener = listener
+
+    def start_notifications(self, listener):
+        if not _callbacks_available:
+            return False
+        if self._dispatcher is None:
+            self._dispatcher = EventDispatcher()
+        self._dispatcher.listener = listener
+        try:
+            # The worker's apartment is multithreaded, as session notifications require
+            self._worker.call(self._start_notifications, self._dispatcher)
+            return True
+        except Exception as e:
+            logger.warning("Audio notifications unavailable, falling back to polling: %s", e)
+            return False
+
+
+# --- Circuit breaker ---
+
+class GuardedSession(AudioSession):
+    """AudioSession whose calls go through a GuardedBackend's breaker."""
+
+    def __init__(self, session, breaker):
+        self._session = session
+        self._breaker = breaker
+        self.key = session.key
+        self.pid = session.pid
+        self.name = session.name
+
+    def get_volume(self):
+        return self._breaker.call(self._session.get_volume)
+
+    def set_volume(self, level):
+        self._breaker.call(self._session.set_volume, level)
+
+    def get_mute(self):
+        return self._breaker.call(self._session.get_mute)
+
+    def set_mute(self, muted):
+        self._breaker.call(self._session.set_mute, muted)
+
+
+class GuardedBackend(AudioBackend):
+    """
+    Another backend behind a circuit breaker (`breaker`). Every backend and
+    session call counts towards it; after repeated failures calls raise
+    CircuitOpenError at once while a probe (list sessions, read the master)
+    retries in the background. The notification listener gets
+    BACKEND_RECOVERED when the probe succeeds.
+    """
+
+    def __init__(self, backend, threshold=3, probe_interval=2.0, max_probe_interval=30.0):
+        self.inner = backend
+        self.name = backend.name
+        self._listener = None
+        self.breaker = CircuitBreaker(f"Audio backend ({backend.name})", self._probe, threshold,
+                                      probe_interval, max_probe_interval)
+        self.breaker.add_recovery_listener(self._recovered)
+
+    def _probe(self):
+        self.inner.list_sessions()
+        self.inner.get_master()
+
+    def _recovered(self):
+        if self._listener is not None:
+            self._listener(BACKEND_RECOVERED, None)
+
+    def is_available(self):
+        return self.inner.is_available()
+
+    def list_sessions(self):
+        return [GuardedSession(session, self.breaker) for session in self.breaker.call(self.inner.list_sessions)]
+
+    def get_master(self):
+        return self.breaker.call(self.inner.get_master)
+
+    def set_master_volume(self, level):
+        self.breaker.call(self.inner.set_master_volume, level)
+
+    def set_master_mute(self, muted):
+        self.breaker.call(self.inner.set_master_mute, muted)
+
+    def list_devices(self):
+        return self.breaker.call(self.inner.list_devices)
+
+    def set_default_device(self, device_id):
+        self.breaker.call(self.inner.set_default_device, device_id)
+
+    def get_device_volume(self, device_id):
+        return self.breaker.call(self.inner.get_device_volume, device_id)
+
+    def set_device_volume(self, device_id, level):
+        self.breaker.call(self.inner.set_device_volume, device_id, level)
+
+    def set_device_mute(self, device_id, muted):
+        self.breaker.call(self.inner.set_device_mute, device_id, muted)
+
+    def read_peaks(self, sessions):
+        inner_sessions = [getattr(session, '_session', session) for session in sessions]
+        return self.breaker.call(self.inner.read_peaks, inner_sessions)
+
+    def start_notifications(self, listener):
+        if self.breaker.is_open:
+            return False
+
+        def guarded(event, payload):
+            if event == SESSION_ADDED:
+                payload = GuardedSession(payload, self.breaker)
+            listener(event, payload)
+
+        self._listener = listener
+        return self.inner.start_notifications(guarded)
+
+
+# --- In-memory fake ---
+
+# Backends create_backend() knows, and the options a "fake" spec accepts (with their types)
+BACKENDS = ('pycaw', 'fake')
+FAKE_OPTIONS = {
+    'sessions': int,       # sessions to start with
+    'apps': int,           # distinct process names they are spread over
+    'latency_ms': float,   # simulated cost of each backend call
+    'failure_rate': float,  # probability that a call raises FakeAudioError
+    'seed': int,           # seed for volumes and failures (runs are repeatable)
+    'notifications': int,  # 0 = behave like a system without session notifications
+}
+
+# Devices a FakeAudioBackend starts with: (id, name, flow); the first of each flow is the default
+FAKE_DEVICES = (
+    ('fake-speakers', 'Speakers', 'render'),
+    ('fake-headphones', 'Headphones', 'render'),
+    ('fake-microphone', 'Microphone', 'capture'),
+    ('fake-headset-mic', 'Headset Microphone', 'capture'),
+)
+
+
+class FakeAudioError(RuntimeError):
+    """Raised by a FakeAudioBackend call picked to fail."""
+
+
+class FakeSession(AudioSession):
+    """AudioSession held by FakeAudioBackend."""
+
+    def __init__(self, backend, key, pid, name, volume=1.0, muted=False):
+        self._backend = backend
+        self.key = key
+        self.pid = pid
+        self.name = name
+        self.volume = volume
+        self.muted = muted
+
+    def get_volume(self):
+        self._backend._call('session_get')
+        return self.volume
+
+    def set_volume(self, level):
+        self._backend._call('session_set')
+        self.volume = level
+        self._backend._emit(SESSION_CHANGED, (self.key, self.volume, self.muted))
+
+    def get_mute(self):
+        self._backend._call('session_get')
+        return self.muted
+
+    def set_mute(self, muted):
+        self._backend._call('session_set')
+        self.muted = bool(muted)
+        self._backend._emit(SESSION_CHANGED, (self.key, self.volume, self.muted))
+
+    def peak(self, now):
+        """Simulated peak: a wave per PID scaled by volume, silent when muted."""
+        if self.muted:
+            return 0.0
+        return self.volume * (0.5 + 0.5 * math.sin(now * 3.0 + self.pid))
+
+
+class FakeAudioBackend(AudioBackend):
+    """
+    In-memory backend with the same events as Windows.
+    Use add_session / remove_session / set_master / add_device / remove_device
+    to simulate outside changes. The master is the default render device's
+    volume. Backend and session calls run one at a time (like the COM worker)
+    and are counted in `calls` by kind: list_sessions, session_get, session_set,
+    master_get, master_set, meter_read, device_list, device_get, device_set.
+    """
+    name = 'fake'
+
+    def __init__(self, sessions=None, master_volume=1.0, master_muted=False, notifications=True,
+                 latency=0.0, failure_rate=0.0, seed=0, devices=FAKE_DEVICES):
+        """
+        sessions: optional list of (pid, name) or (pid, name, volume, muted) tuples.
+        devices: (id, name, flow) tuples; the first device of each flow is its default.
+        notifications=False makes start_notifications() refuse, like a system without them.
+        latency: seconds each call takes (list_sessions takes one more per session).
+        failure_rate: probability (0.0-1.0) that a call raises FakeAudioError, drawn from
+        a generator seeded with seed so a run fails the same way every time.
+        """
+        self.notifications = notifications
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = {}
+        self._random = random.Random(seed)
+        self._fail_next = 0
+        self._call_lock = threading.Lock()
+        self._lock = threading.RLock()
+        self._sessions = {}
+        self._next_key = 1
+        self._listener = None
+        self.master_volume = master_volume
+        self.master_muted = master_muted
+        self._devices = {}
+        self.defaults = {flow: None for flow in DEVICE_FLOWS}
+        for spec in devices:
+            self.add_device(*spec)
+        for spec in sessions or []:
+            self.add_session(*spec)
+
+    def is_available(self):
+        return True
+
+    def fail_calls(self, count):
+        """Make the next count calls raise FakeAudioError (0 stops it)."""
+        with self._call_lock:
+            self._fail_next = count
+
+    def _call(self, kind, cost=1):
+        """Count one call, spend its simulated latency and maybe fail it."""
+        with self._call_lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+            if self.latency:
+                time.sleep(self.latency * cost)
+            if self._fail_next > 0:
+                self._fail_next -= 1
+                raise FakeAudioError(f"Injected failure in {kind}")
+            if self.failure_rate and self._random.random() < self.failure_rate:
+                raise FakeAudioError(f"Injected failure in {kind}")
+
+    def _emit(self, event, payload):
+        if self._listener is not None:
+            self._listener(event, payload)
+
+    def add_session(self, pid, name, volume=1.0, muted=False):
+        """Create a session (as if an app started playing audio). Returns the FakeSession."""
+        with self._lock:
+            session = FakeSession(self, f"fake-{self._next_key}", pid, name, volume, muted)
+            self._next_key += 1
+            self._sessions[session.key] = session
+        self._emit(SESSION_ADDED, session)
+        return session
+
+    def remove_session(self, key):
+        """Expire a session by key."""
+        with self._lock:
+            removed = self._sessions.pop(key, None)
+        if removed is not None:
+            self._emit(SESSION_REMOVED, key)
+
+    def set_master(self, volume=None, muted=None):
+        """Change the master state from outside (as if the user used the system mixer)."""
+        if volume is not None:
+            self.master_volume = volume
+        if muted is not None:
+            self.master_muted = bool(muted)
+        self._emit(MASTER_CHANGED, (self.master_volume, self.master_muted))
+
+    def add_device(self, device_id, name, flow, volume=1.0, muted=False):
+        """Plug in a device (the first one of a flow becomes its default)."""
+        if flow not in DEVICE_FLOWS:
+            raise ValueError(f"Device flow must be one of: {', '.join(DEVICE_FLOWS)}")
+        with self._lock:
+            self._devices[device_id] = {'id': device_id, 'name': name, 'flow': flow,
+                                        'volume': volume, 'muted': muted}
+            if self.defaults[flow] is None:
+                self.defaults[flow] = device_id
+        self._emit(DEVICES_CHANGED, None)
+
+    def remove_device(self, device_id):
+        """Unplug a device; a removed default is replaced by the next device of its flow."""
+        with self._lock:
+            device = self._devices.pop(device_id, None)
+            if device is None:
+                return
+            flow = device['flow']
+            replaced = self.defaults[flow] == device_id
+            if replaced:
+                self.defaults[flow] = next((d['id'] for d in self._devices.values() if d['flow'] == flow), None)
+        if replaced and flow == 'render' and self.defaults[flow] is not None:
+            self._switch_master(self.defaults[flow], keep=False)
+        self._emit(DEVICES_CHANGED, None)
+
+    def _device(self, device_id):
+        device = self._devices.get(device_id)
+        if device is None:
+            raise ValueError(f"Unknown audio device: {device_id}")
+        return device
+
+    def _switch_master(self, device_id, keep=True, sessions=None):
+        """Make device_id the default render device: the master takes over its volume and mute."""
+        with self._lock:
+            old = self._devices.get(self.defaults['render'])
+            if keep and old is not None:
+                old['volume'], old['muted'] = self.master_volume, self.master_muted
+            self.defaults['render'] = device_id
+            device = self._devices[device_id]
+            self.master_volume, self.master_muted = device['volume'], device['muted']
+            if sessions is not None:
+                self._sessions = {}
+        for spec in sessions or []:
+            self.add_session(*spec)
+        self._emit(DEFAULT_DEVICE_CHANGED, device_id)
+
+    def switch_default_device(self, device_id, sessions=None, master_volume=1.0, master_muted=False):
+        """Simulate a new default playback device with its own sessions and master state."""
+        with self._lock:
+            if device_id not in self._devices:
+                self._devices[device_id] = {'id': device_id, 'name': device_id, 'flow': 'render'}
+            self._devices[device_id].update(volume=master_volume, muted=master_muted)
+        self._switch_master(device_id, sessions=sessions or [])
+        self._emit(DEVICES_CHANGED, None)
+
+    def list_sessions(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+        self._call('list_sessions', 1 + len(sessions))
+        return sessions
+
+    def get_master(self):
+        self._call('master_get')
+        return self.master_volume, self.master_muted
+
+    def set_master_volume(self, level):
+        self._call('master_set')
+        self.set_master(volume=level)
+
+    def set_master_mute(self, muted):
+        self._call('master_set')
+        self.set_master(muted=muted)
+
+    def list_devices(self):
+        with self._lock:
+            devices = [{'id': d['id'], 'name': d['name'], 'flow': d['flow']} for d in self._devices.values()]
+            defaults = dict(self.defaults)
+        self._call('device_list', 1 + len(devices))
+        return devices, defaults
+
+    def set_default_device(self, device_id):
+        self._call('device_set')
+        device = self._device(device_id)
+        if self.defaults[device['flow']] == device_id:
+            return
+        if device['flow'] == 'render':
+            # Sessions stay: apps follow the default device
+            self._switch_master(device_id)
+        else:
+            self.defaults[device['flow']] = device_id
+        self._emit(DEVICES_CHANGED, None)
+
+    def get_device_volume(self, device_id):
+        self._call('device_get')
+        device = self._device(device_id)
+        if device_id == self.defaults['render']:
+            return self.master_volume, self.master_muted
+        return device['volume'], device['muted']
+
+    def set_device_volume(self, device_id, level):
+        self._call('device_set')
+        if device_id == self.defaults['render']:
+            self.set_master(volume=level)
+        else:
+            self._device(device_id)['volume'] = level
+
+    def set_device_mute(self, device_id, muted):
+        self._call('device_set')
+        if device_id == self.defaults['render']:
+            self.set_master(muted=muted)
+        else:
+            self._device(device_id)['muted'] = bool(muted)
+
+    def read_peaks(self, sessions):
+        self._call('meter_read', 1 + len(sessions))
+        now = time.monotonic()
+        peaks = {session.key: session.peak(now) for session in sessions}
+        if self.master_muted:
+            return peaks, 0.0
+        return peaks, self.master_volume * max(peaks.values(), default=0.0)
+
+    def start_notifications(self, listener):
+        if not self.notifications:
+            return False
+        self._listener = listener
+        return True
+
+
+def fake_sessions(count, apps=10, seed=0):
+    """
+    count session tuples for FakeAudioBackend, spread over `apps` process names
+    (app0.exe, app1.exe, ...) with PIDs from 1000 and volumes picked from seed.
+    """
+    rng = random.Random(seed)
+    return [(1000 + index, f"app{index % max(1, apps)}.exe", round(rng.uniform(0.2, 1.0), 2), False)
+            for index in range(count)]
+
+
+def parse_backend_spec(spec):
+    """
+    Split a backend spec into (name, options): "pycaw", "fake" or
+    "fake:sessions=200,apps=20,latency_ms=1.5,failure_rate=0.01,seed=1,notifications=0".
+    Raises ValueError for unknown backends, options or values.
+    """
+    name, _, rest = spec.strip().partition(':')
+    if name not in BACKENDS:
+        raise ValueError(f"Audio backend must be one of: {', '.join(BACKENDS)}")
+    options = {}
+    for item in filter(None, (part.strip() for part in rest.split(','))):
+        key, _, value = item.partition('=')
+        key = key.strip()
+        if name != 'fake' or key not in FAKE_OPTIONS:
+            raise ValueError(f"Unknown option for the {name} backend: {key}")
+        try:
+            options[key] = FAKE_OPTIONS[key](value)
+        except ValueError:
+            raise ValueError(f"Invalid value for {key}: {value}")
+        if options[key] < 0 or (key == 'failure_rate' and options[key] > 1):
+            raise ValueError(f"Invalid value for {key}: {value}")
+    return name, options
+
+
+def create_backend(spec):
+    """Build the backend a spec names (see parse_backend_spec)."""
+    name, options = parse_backend_spec(spec)
+    if name == 'pycaw':
+        return PycawBackend()
+    seed = options.get('seed', 0)
+    return FakeAudioBackend(
+        sessions=fake_sessions(options.get('sessions', 8), options.get('apps', 10), seed),
+        notifications=bool(options.get('notifications', 1)),
+        latency=options.get('latency_ms', 0.0) / 1000.0,
+        failure_rate=options.get('failure_rate', 0.0),
+        seed=seed,
+    )
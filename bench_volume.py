@@ -0,0 +1,102 @@
+"""
+Benchmark the volume path against the fake audio backend.
+
+Runs a few workloads through volume_controller (name lookups, a volume dial
+spun from several threads, one bulk change, app list reads) and prints for
+each its wall time and the backend calls it cost, read from the fake's
+`calls` counters. Runs on any OS:
+
+    python bench_volume.py
+    python bench_volume.py --backend fake:sessions=500,apps=50,latency_ms=0.5 --steps 400 --coalesce-ms 5
+"""
+
+import argparse
+import threading
+import time
+
+import audio_backends
+import volume_controller
+
+DEFAULT_BACKEND = 'fake:sessions=200,apps=20,latency_ms=0.2'
+
+
+def _run(name, backend, work):
+    """Run work() and return (name, seconds, {call kind: count})."""
+    before = dict(backend.calls)
+    started = time.perf_counter()
+    work()
+    elapsed = time.perf_counter() - started
+    calls = {kind: count - before.get(kind, 0) for kind, count in backend.calls.items()
+             if count != before.get(kind, 0)}
+    return name, elapsed, calls
+
+
+def _lookups(steps):
+    def work():
+        for index in range(steps):
+            volume_controller.get_volume(f"app{index % 10}.exe")
+    return work
+
+
+def _dial(steps, threads):
+    def spin():
+        for _ in range(steps // threads):
+            volume_controller.volume_up('app0.exe', 0.001)
+
+    def work():
+        workers = [threading.Thread(target=spin) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    return work
+
+
+def _bulk():
+    def work():
+        volume_controller.apply_bulk([{'op': 'set', 'all_except': ['app0.exe'], 'volume': 0.5},
+                                      {'op': 'mute', 'app': 'app1.exe'}])
+    return work
+
+
+def _app_list(steps):
+    def work():
+        for _ in range(steps):
+            volume_controller.get_app_groups()
+    return work
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--backend', default=DEFAULT_BACKEND,
+                        help=f"fake backend spec (default: {DEFAULT_BACKEND})")
+    parser.add_argument('--steps', type=int, default=200, help="operations per workload (default: 200)")
+    parser.add_argument('--threads', type=int, default=8, help="threads spinning the dial (default: 8)")
+    parser.add_argument('--coalesce-ms', type=float, default=volume_controller.COALESCE_WINDOW * 1000,
+                        help="coalescing window for the dial (default: %(default)g)")
+    args = parser.parse_args(argv)
+
+    name, _options = audio_backends.parse_backend_spec(args.backend)
+    if name != 'fake':
+        parser.error("--backend must be a fake backend spec (call counts come from the fake)")
+    backend = audio_backends.create_backend(args.backend)
+    volume_controller.set_backend(backend)
+    volume_controller.set_coalesce_window(args.coalesce_ms / 1000)
+
+    results = [
+        _run('first enumeration', backend, volume_controller.get_audio_sessions),
+        _run(f'{args.steps} lookups by name', backend, _lookups(args.steps)),
+        _run(f'dial: {args.steps} steps on {args.threads} threads', backend, _dial(args.steps, args.threads)),
+        _run('bulk: all_except + mute', backend, _bulk()),
+        _run(f'{args.steps} app list reads', backend, _app_list(args.steps)),
+    ]
+    print(f"Backend: {args.backend}  coalesce: {args.coalesce_ms:g} ms  "
+          f"notifications: {volume_controller.notifications_active()}")
+    width = max(len(result[0]) for result in results)
+    for label, elapsed, calls in results:
+        summary = ', '.join(f"{kind}={count}" for kind, count in sorted(calls.items())) or 'no backend calls'
+        print(f"  {label:<{width}}  {elapsed * 1000:9.1f} ms  {summary}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Circuit breaker for a dependency that can hang or fail for a while.
+
+Closed: calls go through and consecutive failures are counted. After
+`threshold` of them the breaker opens: calls are refused straight away
+(CircuitOpenError) and a probe runs in the background, backing off from
+`probe_interval` to `max_probe_interval`. The first successful probe (or call)
+closes it again. Logging is one line per trip and one per recovery, so a
+wedged dependency doesn't flood the log.
+"""
+
+import logging
+import math
+import threading
+import time
+
+import scheduler
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the dependency while the breaker is open."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} is not responding; retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Trips after `threshold` consecutive failures and probes with probe() until it succeeds."""
+
+    def __init__(self, name, probe, threshold=3, probe_interval=2.0, max_probe_interval=30.0, timer=None):
+        self.name = name
+        self.threshold = threshold
+        self.probe_interval = probe_interval
+        self.max_probe_interval = max_probe_interval
+        self.failures = 0
+        self._probe = probe
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._open = False
+        self._opened_at = None
+        self._next_probe = None
+        self._interval = probe_interval
+        self._listeners = []
+
+    def add_recovery_listener(self, listener):
+        """Call listener() (on the probe thread) each time the breaker closes after being open."""
+        self._listeners.append(listener)
+
+    @property
+    def is_open(self):
+        return self._open
+
+    def retry_after(self):
+        """Whole seconds until the next probe while open, else None."""
+        with self._lock:
+            if not self._open:
+                return None
+            return max(1, math.ceil(self._next_probe - time.monotonic()))
+
+    def check(self):
+        """Raise CircuitOpenError if calls are currently refused."""
+        if self._open:
+            retry_after = self.retry_after()
+            if retry_after is not None:
+                raise CircuitOpenError(self.name, retry_after)
+
+    def call(self, fn, *args):
+        """Run fn(*args) through the breaker: refuse while open, count the outcome otherwise."""
+        self.check()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            self.failure(e)
+            raise
+        self.success()
+        return result
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            if not self._open:
+                return
+            self._open = False
+            down = time.monotonic() - self._opened_at
+        logger.info(f"{self.name} recovered after {down:.1f}s")
+        for listener in self._listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.error(f"{self.name} recovery listener failed: {str(e)}")
+
+    def failure(self, error):
+        with self._lock:
+            self.failures += 1
+            if self._open or self.failures < self.threshold:
+                return
+            self._open = True
+            self._opened_at = time.monotonic()
+            self._interval = self.probe_interval
+            self._schedule()
+        logger.error(f"{self.name} failed {self.failures} times in a row ({str(error)}); "
+                     f"refusing calls; probing every {self.probe_interval:g}s, backing off to {self.max_probe_interval:g}s")
+
+    def _schedule(self):
+        """Schedule the next probe (call with _lock held)."""
+        if self._timer is None:
+            self._timer = scheduler.Scheduler('circuit-probe')
+        self._next_probe = time.monotonic() + self._interval
+        self._timer.call_later(self._interval, self._run_probe)
+
+    def _run_probe(self):
+        try:
+            self._probe()
+        except Exception as e:
+            logger.debug("%s probe failed: %s", self.name, e)
+            with self._lock:
+                if self._open:
+                    self._interval = min(self.max_probe_interval, self._interval * 2)
+                    self._schedule()
+            return
+        self.success()
@@ -19,8 +19,11 @@ import winreg
 from PIL import Image, ImageDraw
 from keyboard_simulator import KeyboardSimulator
 
+# API the GUI talks to unless main.py passes the address it started the server on
+DEFAULT_SERVER_URL = "http://localhost:3000"
+
 class KeyFreeCompanionGUI:
-    def __init__(self, root):
+    def __init__(self, root, server_url=DEFAULT_SERVER_URL):
         self.root = root
         self.root.title("KeyFree Companion")
         self.root.geometry("800x600")
@@ -35,7 +38,7 @@ class KeyFreeCompanionGUI:
         
         # Server status
         self.server_running = False
-        self.server_url = "http://localhost:3000"
+        self.server_url = server_url
         
         # Message queue for thread communication
         self.message_queue = queue.Queue()
@@ -568,8 +571,9 @@ class KeyFreeCompanionGUI:
                 r = requests.get(f"{self.server_url}/api/volume/apps", timeout=5)
                 if r.status_code == 200:
                     data = r.json()
-                    apps = data.get("apps", [])
-                    names = [a.get("name", "?") for a in apps if a.get("name")]
+                    # One entry per app name, however many processes it has
+                    groups = data.get("groups", [])
+                    names = [g.get("name", "?") for g in groups if g.get("name")]
                     self.message_queue.put({
                         "type": "volume_apps",
                         "apps": names,
@@ -1026,9 +1030,9 @@ class KeyFreeCompanionGUI:
         else:
             self.tray_only_var.set(not enabled)
 
-def main():
+def main(server_url=DEFAULT_SERVER_URL):
     root = tk.Tk()
-    app = KeyFreeCompanionGUI(root)
+    app = KeyFreeCompanionGUI(root, server_url)
     root.mainloop()
 
 if __name__ == "__main__":
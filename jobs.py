@@ -0,0 +1,131 @@
+"""
+Background jobs for actions requested in async mode.
+
+An action submitted here runs on a small worker pool; the caller gets a job id
+straight away and can read status and timing later with get(). At most
+MAX_QUEUED_JOBS wait for a worker; submit() raises QueueFull beyond that.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Worker threads for background jobs
+MAX_WORKERS = 4
+
+# Jobs allowed to wait for a worker; more are refused with QueueFull
+MAX_QUEUED_JOBS = 64
+
+# Finished jobs kept for status queries (oldest are dropped first)
+MAX_FINISHED_JOBS = 500
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='job')
+_jobs = OrderedDict()
+_lock = threading.Lock()
+_queued = 0     # jobs submitted but not started yet (guarded by _lock)
+
+
+class QueueFull(RuntimeError):
+    """Raised by submit() when MAX_QUEUED_JOBS jobs are already waiting."""
+
+
+def _snapshot(job):
+    """Public view of a job record."""
+    info = {key: job[key] for key in ('id', 'action', 'status', 'status_code', 'result', 'error')}
+    created, started, finished = job['created'], job['started'], job['finished']
+    info['created_at'] = job['created_wall']
+    info['queued_ms'] = round(((started or time.monotonic()) - created) * 1000, 1)
+    info['run_ms'] = round((finished - started) * 1000, 1) if finished and started else None
+    return info
+
+
+def _prune():
+    """Drop the oldest finished jobs beyond MAX_FINISHED_JOBS (call with _lock held)."""
+    finished = [job_id for job_id, job in _jobs.items() if job['status'] in ('done', 'failed')]
+    for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[job_id]
+
+
+def submit(fn, action, on_done=None, start=True):
+    """
+    Run fn() in the background.
+    fn returns (result_dict, status_code); an exception marks the job failed.
+    on_done(job_info) is called from the worker thread when the job finishes.
+    start=False only reserves the job; it runs once start(job_id) is called
+    (e.g. after the caller has told its client the job id).
+    Returns the job info dict (status "queued"). Raises QueueFull if too many jobs are waiting.
+    """
+    global _queued
+    job_id = uuid.uuid4().hex[:12]
+    job = {
+        'id': job_id,
+        'action': action,
+        'status': 'queued',
+        'status_code': None,
+        'result': None,
+        'error': None,
+        'created': time.monotonic(),
+        'created_wall': time.time(),
+        'started': None,
+        'finished': None,
+    }
+    with _lock:
+        if _queued >= MAX_QUEUED_JOBS:
+            raise QueueFull(f"Too many background jobs queued ({MAX_QUEUED_JOBS}); retry later")
+        _queued += 1
+        _jobs[job_id] = job
+        _prune()
+
+    def run():
+        global _queued
+        with _lock:
+            _queued -= 1
+        job['started'] = time.monotonic()
+        job['status'] = 'running'
+        try:
+            result, status_code = fn()
+            job['result'] = result
+            job['status_code'] = status_code
+            job['status'] = 'done' if status_code < 400 else 'failed'
+        except Exception as e:
+            logger.error(f"Job {job_id} ({action}) failed: {str(e)}")
+            job['error'] = str(e)
+            job['status_code'] = 500
+            job['status'] = 'failed'
+        job['finished'] = time.monotonic()
+        if on_done is not None:
+            try:
+                on_done(_snapshot(job))
+            except Exception as e:
+                logger.debug("Job completion callback failed: %s", e)
+
+    job['run'] = run
+    if start:
+        _start(job)
+    return _snapshot(job)
+
+
+def _start(job):
+    run = job.pop('run', None)
+    if run is not None:
+        _executor.submit(run)
+
+
+def start(job_id):
+    """Start a job submitted with start=False."""
+    with _lock:
+        job = _jobs.get(job_id)
+    if job is not None:
+        _start(job)
+
+
+def get(job_id):
+    """Return the job info dict, or None if unknown (or already pruned)."""
+    with _lock:
+        job = _jobs.get(job_id)
+        return _snapshot(job) if job is not None else None
@@ -1,12 +1,248 @@
 from pynput import keyboard
 from pynput.keyboard import Key, KeyCode
+import sys
 import time
 import threading
+import queue
+import logging
+import collections
+import functools
+import math
+from concurrent.futures import Future
+import scheduler
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Longest hold accepted by down(key, hold=...) and combo(..., hold=...) (seconds)
+MAX_HOLD = 60.0
+
+# Default hold for combo() chords (seconds), same as duo/trio/quartet
+DEFAULT_COMBO_HOLD = 0.1
+
+# Number of compiled combo plans kept (least recently used are dropped)
+COMBO_CACHE_SIZE = 256
+
+# Longest hotkey string accepted by combo()
+MAX_HOTKEY_LENGTH = 256
+
+# Event plan operations understood by InputDispatcher
+PRESS = 'press'
+RELEASE = 'release'
+WAIT = 'wait'
+TYPE = 'type'
+ENSURE_LOCK = 'ensure_lock'  # argument: (lock key name, wanted on/off state)
+CALL = 'call'  # argument: function run on the dispatcher thread
+
+# type_string modes: "auto" pastes long texts and types short ones
+TYPE_MODES = ('auto', 'type', 'paste')
+
+# In auto mode, texts at least this long are pasted through the clipboard
+PASTE_THRESHOLD = 200
+
+# Time the target app gets to read the clipboard before it is restored (seconds)
+PASTE_RESTORE_DELAY = 0.25
+
+# With a typing rate, text is sent in chunks of about this many seconds' worth
+TYPE_CHUNK_SECONDS = 0.05
+
+# Slowest accepted typing rate (characters per second) and longest rate-limited typing run (seconds)
+MIN_CPS = 1.0
+MAX_TYPE_DURATION = 60.0
+
+_pyperclip_available = False
+try:
+    import pyperclip
+    _pyperclip_available = True
+except ImportError:
+    pass
+
+# Whether pyperclip can actually reach a clipboard (None = not probed yet)
+_clipboard_usable = None
+
+
+def clipboard_usable():
+    """True if pyperclip is installed and has a working copy/paste mechanism (probed once)."""
+    global _clipboard_usable
+    if _clipboard_usable is None:
+        if not _pyperclip_available:
+            _clipboard_usable = False
+        else:
+            try:
+                pyperclip.paste()
+                _clipboard_usable = True
+            except Exception as e:
+                logger.warning(f"Clipboard not usable, long texts will be typed: {str(e)}")
+                _clipboard_usable = False
+    return _clipboard_usable
+
+
+def check_typing_rate(text, cps):
+    """Raise ValueError unless cps is None or a rate at which text is typed within MAX_TYPE_DURATION."""
+    if cps is None:
+        return
+    # NaN compares false against both limits and infinity means no delay at all
+    if not math.isfinite(cps):
+        raise ValueError("cps must be a finite number")
+    if cps < MIN_CPS:
+        raise ValueError(f"cps must be at least {MIN_CPS:g}")
+    if len(text) / cps > MAX_TYPE_DURATION:
+        raise ValueError(f"Typing {len(text)} characters at {cps:g} cps would take longer than "
+                         f"{MAX_TYPE_DURATION:g} seconds")
+
+# Lock keys tracked by LockKeyState: pynput Key name -> Windows virtual-key code
+LOCK_KEY_VKS = {'num_lock': 0x90, 'caps_lock': 0x14, 'scroll_lock': 0x91}
+
+class LockKeyState:
+    """
+    Tracks NumLock, CapsLock and ScrollLock.
+    Each state is read from the OS once (Windows only; elsewhere it stays
+    unknown) and then kept up to date from the lock-key presses we inject.
+    """
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.RLock()
+    
+    def _read_os_state(self, name):
+        """Current toggle state from the OS, or None if it can't be read"""
+        if sys.platform != 'win32':
+            return None
+        try:
+            import ctypes
+            return bool(ctypes.windll.user32.GetKeyState(LOCK_KEY_VKS[name]) & 1)
+        except Exception:
+            return None
+    
+    def get(self, name):
+        """True/False for on/off, or None if unknown"""
+        with self._lock:
+            if name not in self._states:
+                self._states[name] = self._read_os_state(name)
+            return self._states[name]
+    
+    def observe_press(self, key):
+        """Record an injected key press; flips the state if it is a known lock key"""
+        name = getattr(key, 'name', None)
+        if name not in LOCK_KEY_VKS:
+            return
+        with self._lock:
+            state = self.get(name)
+            if state is not None:
+                self._states[name] = not state
+    
+    def needs_toggle(self, name, on):
+        """True only if the lock key is known to be in the other state"""
+        state = self.get(name)
+        return state is not None and state != on
+
+# Queue marker for a plan resuming after a wait
+_RESUME = object()
+
+class InputDispatcher:
+    """
+    Single writer for keyboard injection.
+    Plans (lists of (operation, argument) events) are queued and run one at a
+    time on one thread that owns the controller, so events from concurrent
+    callers never interleave. A WAIT step doesn't sleep: the rest of the plan
+    is handed to the scheduler and resumes when due, and other plans stay
+    queued until it has finished.
+    """
+    def __init__(self, controller, timer=None):
+        self.controller = controller
+        self.timer = timer or scheduler.shared
+        self._queue = queue.Queue()
+        self._waiting = collections.deque()
+        self._active = False
+        self._thread = None
+        self._lock = threading.Lock()
+        self.lock_state = LockKeyState()
+    
+    def submit(self, plan):
+        """Queue a plan. Returns a Future that completes when the plan has run."""
+        future = Future()
+        with self._lock:
+            if self._thread is None:
+                # Started on first use so idle simulators (e.g. the GUI's) cost no thread
+                self._thread = threading.Thread(target=self._run, daemon=True, name='input-dispatcher')
+                self._thread.start()
+        self._queue.put((plan, future))
+        return future
+    
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item[0] is _RESUME:
+                _marker, plan, index, held, future, since = item
+                # Actual hold length, including scheduler and queue delay
+                metrics.observe_stage('hold_wait', time.perf_counter() - since)
+                self._active = False
+                self._step(plan, index, held, future)
+            elif self._active:
+                # A plan is mid-hold; keep this one until it finishes
+                self._waiting.append(item)
+            else:
+                self._start(*item)
+            while self._waiting and not self._active:
+                self._start(*self._waiting.popleft())
+    
+    def _start(self, plan, future):
+        if future.set_running_or_notify_cancel():
+            self._step(plan, 0, [], future)
+    
+    def _step(self, plan, index, held, future):
+        """Run plan events from index until the plan ends or reaches a wait"""
+        try:
+            while index < len(plan):
+                operation, argument = plan[index]
+                index += 1
+                if operation == PRESS:
+                    with metrics.timed('controller_press'):
+                        self.controller.press(argument)
+                    self.lock_state.observe_press(argument)
+                    held.append(argument)
+                elif operation == RELEASE:
+                    with metrics.timed('controller_release'):
+                        self.controller.release(argument)
+                    if argument in held:
+                        held.remove(argument)
+                elif operation == WAIT:
+                    if argument > 0:
+                        self._active = True
+                        self.timer.call_later(argument, self._queue.put, (_RESUME, plan, index, held, future, time.perf_counter()))
+                        return
+                elif operation == TYPE:
+                    with metrics.timed('controller_type'):
+                        self.controller.type(argument)
+                elif operation == CALL:
+                    argument()
+                elif operation == ENSURE_LOCK:
+                    name, on = argument
+                    # Decided here rather than when the plan was built, so queued plans can't double-toggle
+                    if self.lock_state.needs_toggle(name, on):
+                        lock_key = getattr(Key, name)
+                        self.controller.press(lock_key)
+                        self.lock_state.observe_press(lock_key)
+                        self.controller.release(lock_key)
+                else:
+                    raise ValueError(f"Unknown plan operation: {operation}")
+        except Exception as e:
+            # Don't leave keys from a half-finished plan stuck down
+            for key in reversed(held):
+                try:
+                    self.controller.release(key)
+                except Exception:
+                    pass
+            future.set_exception(e)
+            return
+        future.set_result(None)
 
 class KeyboardSimulator:
     def __init__(self):
-        # Initialize the keyboard controller
+        # Initialize the keyboard controller; only the dispatcher thread touches it
         self.controller = keyboard.Controller()
+        self.dispatcher = InputDispatcher(self.controller)
+        # Hotkey spec -> compiled event plan, bounded LRU
+        self.compile_combo = functools.lru_cache(maxsize=COMBO_CACHE_SIZE)(self._compile_combo)
         
         # Available keys mapping
         self.available_keys = {
@@ -50,6 +286,7 @@ class KeyboardSimulator:
             'pageup': Key.page_up, 'page_up': Key.page_up,
             'pagedown': Key.page_down, 'page_down': Key.page_down,
             'numlock': Key.num_lock, 'num_lock': Key.num_lock,
+            'capslock': Key.caps_lock, 'caps_lock': Key.caps_lock,
             
             # Arrow keys
             'up': Key.up, 'up_arrow': Key.up, 'uparrow': Key.up,
@@ -97,45 +334,61 @@ class KeyboardSimulator:
             'parenthesis_left': '(', '(': '(',
             'parenthesis_right': ')', ')': ')',
         }
+        # ScrollLock is not defined by pynput on every platform
+        if hasattr(Key, 'scroll_lock'):
+            self.available_keys['scrolllock'] = Key.scroll_lock
+            self.available_keys['scroll_lock'] = Key.scroll_lock
     
     def normalize_key(self, key):
         """Convert key name to pynput Key or KeyCode"""
-        if key in self.available_keys:
-            return self.available_keys[key]
-        return None
+        with metrics.timed('normalize_key'):
+            if key in self.available_keys:
+                return self.available_keys[key]
+            return None
+    
+    def _run_plan(self, plan, wait=True):
+        """
+        Hand a compiled event plan to the dispatcher.
+        With wait=True, block until it has run (and raise its error); otherwise
+        return the Future straight away and log any failure.
+        """
+        future = self.dispatcher.submit(plan)
+        if wait:
+            future.result()
+        else:
+            future.add_done_callback(self._log_failure)
+        return future
+    
+    @staticmethod
+    def _log_failure(future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Keyboard plan failed: {str(future.exception())}")
+    
+    def _chord_plan(self, keys, hold):
+        """Press keys in order, hold, then release in reverse order"""
+        plan = [(PRESS, key) for key in keys]
+        plan.append((WAIT, hold))
+        plan.extend((RELEASE, key) for key in reversed(keys))
+        return plan
     
-    def single(self, key):
+    def single(self, key, wait=True):
         """Simulate a single key press"""
         normalized_key = self.normalize_key(key)
         if not normalized_key:
             raise ValueError(f"Invalid key: {key}")
         
+        plan = []
+        # For numpad keys, ensure NumLock is on (toggled only if it is known to be off)
+        if key.startswith('keypad') and key != 'keypadenter':
+            plan.append((ENSURE_LOCK, ('num_lock', True)))
+        plan.extend(self._chord_plan([normalized_key], 0.05))  # Hold for 50ms
+        
         try:
-            # For numpad keys, ensure NumLock is on
-            if key.startswith('keypad') and key != 'keypadenter':
-                self._ensure_numlock_on()
-            
-            self.controller.press(normalized_key)
-            time.sleep(0.05)  # Hold for 50ms
-            self.controller.release(normalized_key)
+            self._run_plan(plan, wait)
         except Exception as e:
             raise Exception(f"Failed to send key {normalized_key}: {str(e)}")
     
-    def _ensure_numlock_on(self):
-        """Ensure NumLock is turned on for numpad operations"""
-        try:
-            # Check if NumLock is off by trying to send a numpad key
-            # If it sends a different character, NumLock is off
-            # We'll temporarily turn it on
-            self.controller.press(Key.num_lock)
-            time.sleep(0.01)
-            self.controller.release(Key.num_lock)
-            time.sleep(0.01)
-        except:
-            # If num_lock key is not available, we'll try alternative approach
-            pass
-    
-    def duo(self, key1, key2):
+    def duo(self, key1, key2, wait=True):
         """Simulate a two-key combination"""
         normalized_key1 = self.normalize_key(key1)
         normalized_key2 = self.normalize_key(key2)
@@ -144,20 +397,11 @@ class KeyboardSimulator:
             raise ValueError(f"Invalid keys: {key1}, {key2}")
         
         try:
-            # Press both keys down
-            self.controller.press(normalized_key1)
-            self.controller.press(normalized_key2)
-            
-            # Hold for a moment
-            time.sleep(0.1)
-            
-            # Release in reverse order
-            self.controller.release(normalized_key2)
-            self.controller.release(normalized_key1)
+            self._run_plan(self._chord_plan([normalized_key1, normalized_key2], 0.1), wait)
         except Exception as e:
             raise Exception(f"Failed to send combination {normalized_key1}+{normalized_key2}: {str(e)}")
     
-    def trio(self, key1, key2, key3):
+    def trio(self, key1, key2, key3, wait=True):
         """Simulate a three-key combination"""
         normalized_key1 = self.normalize_key(key1)
         normalized_key2 = self.normalize_key(key2)
@@ -167,22 +411,11 @@ class KeyboardSimulator:
             raise ValueError(f"Invalid keys: {key1}, {key2}, {key3}")
         
         try:
-            # Press all keys down
-            self.controller.press(normalized_key1)
-            self.controller.press(normalized_key2)
-            self.controller.press(normalized_key3)
-            
-            # Hold for a moment
-            time.sleep(0.1)
-            
-            # Release in reverse order
-            self.controller.release(normalized_key3)
-            self.controller.release(normalized_key2)
-            self.controller.release(normalized_key1)
+            self._run_plan(self._chord_plan([normalized_key1, normalized_key2, normalized_key3], 0.1), wait)
         except Exception as e:
             raise Exception(f"Failed to send combination {normalized_key1}+{normalized_key2}+{normalized_key3}: {str(e)}")
     
-    def quartet(self, key1, key2, key3, key4):
+    def quartet(self, key1, key2, key3, key4, wait=True):
         """Simulate a four-key combination"""
         normalized_key1 = self.normalize_key(key1)
         normalized_key2 = self.normalize_key(key2)
@@ -193,54 +426,151 @@ class KeyboardSimulator:
             raise ValueError(f"Invalid keys: {key1}, {key2}, {key3}, {key4}")
         
         try:
-            # Press all keys down
-            self.controller.press(normalized_key1)
-            self.controller.press(normalized_key2)
-            self.controller.press(normalized_key3)
-            self.controller.press(normalized_key4)
-            
-            # Hold for a moment
-            time.sleep(0.1)
-            
-            # Release in reverse order
-            self.controller.release(normalized_key4)
-            self.controller.release(normalized_key3)
-            self.controller.release(normalized_key2)
-            self.controller.release(normalized_key1)
+            self._run_plan(self._chord_plan([normalized_key1, normalized_key2, normalized_key3, normalized_key4], 0.1), wait)
         except Exception as e:
             raise Exception(f"Failed to send combination {normalized_key1}+{normalized_key2}+{normalized_key3}+{normalized_key4}: {str(e)}")
     
-    def down(self, key):
-        """Simulate key down"""
+    def _compile_combo(self, spec, hold):
+        """
+        Compile a combo into an event plan (cached by compile_combo).
+        spec: a hotkey string such as "ctrl+shift+s" or "ctrl+k, ctrl+c" (comma separates
+        chords pressed one after another), or a tuple of key names forming one chord.
+        """
+        if isinstance(spec, str):
+            if len(spec) > MAX_HOTKEY_LENGTH:
+                raise ValueError(f"Hotkey string is longer than {MAX_HOTKEY_LENGTH} characters")
+            chords = [[name.strip().lower() for name in chord.split('+')] for chord in spec.split(',')]
+        else:
+            chords = [list(spec)]
+        
+        plan = []
+        for chord in chords:
+            if not chord or any(not name for name in chord):
+                raise ValueError(f"Invalid hotkey: {spec!r} (use 'plus' and 'comma' for those keys)")
+            keys = []
+            for name in chord:
+                normalized_key = self.normalize_key(name) if isinstance(name, str) else None
+                if not normalized_key:
+                    raise ValueError(f"Invalid key: {name}")
+                keys.append(normalized_key)
+            plan.extend(self._chord_plan(keys, hold))
+        return tuple(plan)
+    
+    def combo(self, keys, hold=DEFAULT_COMBO_HOLD, wait=True):
+        """
+        Simulate any number of keys held together, or a sequence of such chords.
+        keys: list of key names (one chord) or a hotkey string like "ctrl+k, ctrl+c".
+        hold: seconds each chord is held.
+        """
+        if not 0 <= hold <= MAX_HOLD:
+            raise ValueError(f"Hold must be between 0 and {MAX_HOLD} seconds")
+        if isinstance(keys, str):
+            spec = keys
+        elif isinstance(keys, (list, tuple)) and keys:
+            spec = tuple(keys)
+        else:
+            raise ValueError("Keys must be a non-empty list or a hotkey string")
+        try:
+            plan = self.compile_combo(spec, hold)
+        except TypeError:
+            # Unhashable entries in the key list
+            raise ValueError(f"Invalid keys: {keys}")
+        
+        try:
+            self._run_plan(plan, wait)
+        except Exception as e:
+            raise Exception(f"Failed to send combo {keys}: {str(e)}")
+    
+    def down(self, key, hold=None, wait=True):
+        """Simulate key down. With hold (seconds), the key is released automatically after that long."""
         normalized_key = self.normalize_key(key)
         if not normalized_key:
             raise ValueError(f"Invalid key: {key}")
+        if hold is not None and not 0 <= hold <= MAX_HOLD:
+            raise ValueError(f"Hold must be between 0 and {MAX_HOLD} seconds")
         
         try:
-            self.controller.press(normalized_key)
+            self._run_plan([(PRESS, normalized_key)], wait)
+            if hold is not None:
+                # Released by the scheduler; other input is not blocked meanwhile
+                self.dispatcher.timer.call_later(hold, self._run_plan, [(RELEASE, normalized_key)], False)
         except Exception as e:
             raise Exception(f"Failed to send key down {normalized_key}: {str(e)}")
     
-    def up(self, key):
+    def up(self, key, wait=True):
         """Simulate key up"""
         normalized_key = self.normalize_key(key)
         if not normalized_key:
             raise ValueError(f"Invalid key: {key}")
         
         try:
-            self.controller.release(normalized_key)
+            self._run_plan([(RELEASE, normalized_key)], wait)
         except Exception as e:
             raise Exception(f"Failed to send key up {normalized_key}: {str(e)}")
     
-    def type_string(self, text):
-        """Type a string"""
+    def _paste_plan(self, text):
+        """Save the clipboard, paste text with the paste shortcut, then restore the clipboard"""
+        saved = {}
+        
+        def set_clipboard():
+            global _clipboard_usable
+            try:
+                saved['text'] = pyperclip.paste()
+                pyperclip.copy(text)
+            except Exception:
+                # Later auto-mode texts get typed instead
+                _clipboard_usable = False
+                raise
+        
+        def restore_clipboard():
+            pyperclip.copy(saved.get('text') or '')
+        
+        modifier = Key.cmd if sys.platform == 'darwin' else Key.ctrl
+        plan = [(CALL, set_clipboard)]
+        plan.extend(self._chord_plan([modifier, 'v'], 0.02))
+        plan.append((WAIT, PASTE_RESTORE_DELAY))
+        plan.append((CALL, restore_clipboard))
+        return plan
+    
+    def _typing_plan(self, text, cps):
+        """Type text all at once, or in timed chunks at cps characters per second"""
+        if not cps:
+            return [(TYPE, text)]
+        chunk_size = max(1, int(cps * TYPE_CHUNK_SECONDS))
+        plan = []
+        for start in range(0, len(text), chunk_size):
+            chunk = text[start:start + chunk_size]
+            plan.append((TYPE, chunk))
+            plan.append((WAIT, len(chunk) / cps))
+        return plan
+    
+    def type_string(self, text, mode='auto', cps=None, wait=True):
+        """
+        Type a string.
+        mode: "type" injects each character, "paste" goes through the clipboard,
+        "auto" pastes texts of PASTE_THRESHOLD characters or more when the clipboard is usable
+        and no typing rate is given.
+        cps: optional typing rate (characters per second, at least MIN_CPS) for typed text.
+        Returns the mode actually used.
+        """
         if not text or not isinstance(text, str):
             raise ValueError("Text parameter must be a non-empty string")
+        if mode not in TYPE_MODES:
+            raise ValueError(f"Mode must be one of: {', '.join(TYPE_MODES)}")
+        check_typing_rate(text, cps)
+        if mode == 'paste' and not _pyperclip_available:
+            raise ValueError("Paste mode requires pyperclip")
+        if mode == 'paste' and not clipboard_usable():
+            raise ValueError("Paste mode needs a working clipboard")
+        if mode == 'auto':
+            mode = 'paste' if cps is None and len(text) >= PASTE_THRESHOLD and clipboard_usable() else 'type'
         
+        plan = self._paste_plan(text) if mode == 'paste' else self._typing_plan(text, cps)
         try:
-            self.controller.type(text)
+            self._run_plan(plan, wait)
         except Exception as e:
             raise Exception(f"Failed to type string: {str(e)}")
+        return mode
     
     def get_available_keys(self):
         """Get list of available keys"""
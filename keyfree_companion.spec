@@ -14,6 +14,7 @@ a = Analysis(
         'pynput.mouse._util_win32',
         'flask',
         'flask_cors',
+        'waitress',
         'requests',
         'pyperclip',
         'tkinter',
@@ -26,6 +27,21 @@ a = Analysis(
         'queue',
         'keyboard_simulator',
         'server',
+        'actions',
+        'ws_server',
+        'jobs',
+        'scheduler',
+        'metrics',
+        'websockets',
+        'websockets.sync.server',
+        'volume_controller',
+        'audio_backends',
+        'circuit_breaker',
+        'volume_events',
+        'volume_meters',
+        'volume_scenes',
+        'pycaw.callbacks',
+        'pycaw.constants',
         'pystray',
         'PIL',
         'PIL.Image',
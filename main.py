@@ -8,19 +8,92 @@ import sys
 import os
 import threading
 import time
-from server import app
+import server
+from server import keyboard_simulator
+import ws_server
+import volume_controller
+import volume_scenes
+import volume_meters
+import audio_backends
 from keyboard_simulator import KeyboardSimulator
 
-def start_server():
-    """Start the Flask API server"""
+def parse_server_options(argv):
+    """
+    Remove server flags from argv and return them as keyword arguments for run_servers().
+    Flags: --engine waitress|dev, --threads N, --host HOST, --port N, --ws-port N, --coalesce-ms N,
+    --scenes-file PATH, --meter-hz N, --audio-backend SPEC (default: $KEYFREE_AUDIO_BACKEND or pycaw)
+    """
+    options = {
+        'host': server.DEFAULT_HOST,
+        'port': server.DEFAULT_PORT,
+        'ws_port': ws_server.DEFAULT_WS_PORT,
+        'engine': server.DEFAULT_ENGINE,
+        'threads': server.DEFAULT_THREADS,
+        'coalesce_ms': volume_controller.COALESCE_WINDOW * 1000,
+        'scenes_file': volume_scenes.SCENES_FILE,
+        'meter_hz': volume_meters.METER_RATE,
+        'audio_backend': os.environ.get('KEYFREE_AUDIO_BACKEND', 'pycaw'),
+    }
+    flags = {
+        '--engine': ('engine', str),
+        '--threads': ('threads', int),
+        '--host': ('host', str),
+        '--port': ('port', int),
+        '--ws-port': ('ws_port', int),
+        '--coalesce-ms': ('coalesce_ms', float),
+        '--scenes-file': ('scenes_file', str),
+        '--meter-hz': ('meter_hz', int),
+        '--audio-backend': ('audio_backend', str),
+    }
+    for flag, (name, convert) in flags.items():
+        if flag in argv:
+            index = argv.index(flag)
+            if index + 1 >= len(argv):
+                raise ValueError(f"{flag} requires a value")
+            options[name] = convert(argv[index + 1])
+            del argv[index:index + 2]
+    if options['engine'] not in server.ENGINES:
+        raise ValueError(f"--engine must be one of: {', '.join(server.ENGINES)}")
+    if options['threads'] < 1:
+        raise ValueError("--threads must be at least 1")
+    if options['coalesce_ms'] < 0:
+        raise ValueError("--coalesce-ms must not be negative")
+    if not 1 <= options['meter_hz'] <= volume_meters.MAX_METER_RATE:
+        raise ValueError(f"--meter-hz must be between 1 and {volume_meters.MAX_METER_RATE}")
+    audio_backends.parse_backend_spec(options['audio_backend'])
+    return options
+
+def run_servers(host, port, ws_port, engine, threads, coalesce_ms, scenes_file, meter_hz, audio_backend):
+    """Start the WebSocket listener and serve the HTTP API (blocks)"""
+    if audio_backend != 'pycaw':
+        volume_controller.set_backend(audio_backends.create_backend(audio_backend))
+    volume_controller.set_coalesce_window(coalesce_ms / 1000)
+    volume_scenes.set_scenes_file(scenes_file)
+    volume_meters.set_rate(meter_hz)
+    ws_server.start(keyboard_simulator, host=host, port=ws_port)
+    server.serve(host=host, port=port, engine=engine, threads=threads)
+
+def client_url(host, port):
+    """URL a local client uses to reach the API bound to host:port (wildcard binds go through localhost)"""
+    if host in ('', '0.0.0.0', '::'):
+        host = 'localhost'
+    elif ':' in host:
+        host = f"[{host}]"
+    return f"http://{host}:{port}"
+
+def start_server(options):
+    """Start the API server"""
     print("🚀 Starting KeyFree Companion API server...")
-    print("📍 Server will be available at: http://localhost:3000")
-    print("🔗 Health check: http://localhost:3000/health")
-    print("📚 API documentation: http://localhost:3000/api/keys")
+    print(f"📍 Server will be available at: http://localhost:{options['port']}")
+    print(f"🔗 Health check: http://localhost:{options['port']}/health")
+    print(f"📚 API documentation: http://localhost:{options['port']}/api/keys")
+    print(f"🔌 WebSocket commands: ws://localhost:{options['ws_port']}")
+    print(f"⚙️  Engine: {options['engine']} ({options['threads']} threads)")
+    if options['audio_backend'] != 'pycaw':
+        print(f"🔊 Audio backend: {options['audio_backend']}")
     print("=" * 60)
     
-    # Run the Flask app
-    app.run(host='0.0.0.0', port=3000, debug=False)
+    run_servers(**options)
 
 def test_keyboard():
     """Test the keyboard simulator"""
@@ -56,43 +129,69 @@ def show_help():
     print("  python main.py start              - Start GUI and server together")
     print("  python main.py start --tray-only  - Start GUI and server, minimized to tray")
     print("  python main.py server             - Start the API server only")
-    print("  python main.py gui                - Start the GUI only")
+    print("  python main.py gui                - Start the GUI only (talks to the server at --host/--port)")
     print("  python main.py test               - Test keyboard functionality")
     print("  python main.py help               - Show this help")
     print()
+    print("Server options (for start and server):")
+    print(f"  --engine waitress|dev   - Serving engine (default: {server.DEFAULT_ENGINE}; dev = Flask development server)")
+    print(f"  --threads N             - Worker threads for waitress (default: {server.DEFAULT_THREADS})")
+    print(f"  --host HOST             - Address to bind (default: {server.DEFAULT_HOST})")
+    print(f"  --port N                - HTTP API port (default: {server.DEFAULT_PORT})")
+    print(f"  --ws-port N             - WebSocket port (default: {ws_server.DEFAULT_WS_PORT})")
+    print(f"  --coalesce-ms N         - Window for merging volume up/down steps (default: {volume_controller.COALESCE_WINDOW * 1000:g}; 0 = off)")
+    print("  --audio-backend SPEC    - pycaw (default) or fake[:sessions=N,apps=N,latency_ms=N,failure_rate=P,seed=N,notifications=0|1]")
+    print("                            for benchmarking without Windows; also read from KEYFREE_AUDIO_BACKEND")
+    print(f"  --meter-hz N            - Peak meter samples per second while subscribed (default: {volume_meters.METER_RATE})")
+    print(f"  --scenes-file PATH      - File for saved volume scenes (default: {volume_scenes.SCENES_FILE})")
+    print()
     print("API Endpoints:")
     print("  GET  /health             - Health check")
     print("  GET  /api/keys           - Get available keys")
+    print("  GET  /metrics            - Prometheus metrics (request and stage latencies)")
     print("  POST /api/single         - Send single key")
     print("  POST /api/duo            - Send two-key combination")
     print("  POST /api/trio           - Send three-key combination")
     print("  POST /api/quartet        - Send four-key combination")
+    print("  POST /api/combo          - Send any key combination or hotkey string")
     print("  POST /api/down           - Send key down")
     print("  POST /api/up             - Send key up")
     print("  POST /api/string         - Type string")
-    print("  GET  /api/volume/apps    - List apps with audio (Windows)")
+    print("  POST /api/batch          - Run a list of steps in order")
+    print("  GET  /api/jobs/<id>      - Status of an async job (?async=1 on any action)")
+    print(f"  WS   :{ws_server.DEFAULT_WS_PORT}/            - Persistent command channel (same actions as /api/batch steps)")
+    print("  GET  /api/volume/apps    - List apps with audio, grouped and versioned (?since=) (Windows)")
     print("  POST /api/volume/up      - Increase app volume")
     print("  POST /api/volume/down    - Decrease app volume")
     print("  POST /api/volume/mute    - Mute app")
     print("  POST /api/volume/unmute  - Unmute app")
+    print("  GET  /api/volume/events  - Stream of volume/mute changes (server-sent events)")
+    print("  GET  /api/volume/meters  - Stream of app and master peak levels (server-sent events)")
+    print("  POST /api/volume/fade    - Fade an app or the master to a level (linear/log)")
+    print("  POST /api/volume/bulk    - Many volume operations in one pass (apps, PIDs, master, all-except)")
+    print("  GET  /api/volume/scenes  - List saved volume scenes (POST saves the current levels)")
+    print("  POST /api/volume/scenes/<name>/restore - Restore a scene in one pass (optional fade)")
+    print("  GET  /api/volume/devices - List playback/recording devices (?flow=render|capture)")
+    print("  POST /api/volume/devices/default - Switch the default device")
+    print("  POST /api/volume/device/set - Set volume/mute of a device by name or id (GET device/get reads it)")
     print()
     print("Example API calls:")
     print("  curl -X POST http://localhost:3000/api/single -H 'Content-Type: application/json' -d '{\"key\": \"a\"}'")
     print("  curl -X POST http://localhost:3000/api/duo -H 'Content-Type: application/json' -d '{\"key1\": \"ctrl\", \"key2\": \"c\"}'")
     print("  curl -X POST http://localhost:3000/api/trio -H 'Content-Type: application/json' -d '{\"key1\": \"meta\", \"key2\": \"shift\", \"key3\": \"s\"}'")
 
-def start_gui():
-    """Start the GUI"""
+def start_gui(options):
+    """Start the GUI (talking to a server on --host/--port)"""
     try:
         from gui import main as gui_main
         print("🚀 Starting KeyFree Companion GUI...")
-        gui_main()
+        gui_main(client_url(options['host'], options['port']))
     except ImportError as e:
         print(f"❌ Failed to start GUI: {e}")
         print("Make sure all dependencies are installed: pip install -r requirements.txt")
         sys.exit(1)
 
-def start_gui_with_server():
+def start_gui_with_server(options):
     """Start both GUI and server together"""
     try:
         import threading
@@ -103,22 +202,19 @@ def start_gui_with_server():
         
         if not is_executable:
             print("🚀 Starting KeyFree Companion with GUI and Server...")
-            print("📍 Server will be available at: http://localhost:3000")
+            print(f"📍 Server will be available at: http://localhost:{options['port']}")
             print("🖥️  GUI will open in a new window")
             print("=" * 60)
         
         # Start server in a separate thread
-        def run_server():
-            app.run(host='0.0.0.0', port=3000, debug=False, use_reloader=False)
-        
-        server_thread = threading.Thread(target=run_server, daemon=True)
+        server_thread = threading.Thread(target=run_servers, kwargs=options, daemon=True)
         server_thread.start()
         
         # Give server a moment to start
         time.sleep(1)
         
         # Start GUI
-        gui_main()
+        gui_main(client_url(options['host'], options['port']))
         
     except ImportError as e:
         print(f"❌ Failed to start GUI: {e}")
@@ -128,7 +224,7 @@ def start_gui_with_server():
         print(f"❌ Failed to start application: {e}")
         sys.exit(1)
 
-def start_gui_with_server_tray_only():
+def start_gui_with_server_tray_only(options):
     """Start both GUI and server together, but start minimized to tray"""
     try:
         import threading
@@ -139,15 +235,12 @@ def start_gui_with_server_tray_only():
         
         if not is_executable:
             print("🚀 Starting KeyFree Companion with GUI and Server (Tray Only)...")
-            print("📍 Server will be available at: http://localhost:3000")
+            print(f"📍 Server will be available at: http://localhost:{options['port']}")
             print("🖥️  GUI will start minimized to system tray")
             print("=" * 60)
         
         # Start server in a separate thread
-        def run_server():
-            app.run(host='0.0.0.0', port=3000, debug=False, use_reloader=False)
-        
-        server_thread = threading.Thread(target=run_server, daemon=True)
+        server_thread = threading.Thread(target=run_servers, kwargs=options, daemon=True)
         server_thread.start()
         
         # Give server a moment to start
@@ -157,7 +250,7 @@ def start_gui_with_server_tray_only():
         # We'll modify the GUI to start minimized
         import os
         os.environ['KEYFREE_TRAY_ONLY'] = '1'
-        gui_main()
+        gui_main(client_url(options['host'], options['port']))
         
     except ImportError as e:
         print(f"❌ Failed to start GUI: {e}")
@@ -175,6 +268,9 @@ def main():
         if tray_only:
             sys.argv.remove('--tray-only')
         
+        # Server flags (--engine, --threads, --host, --port, --ws-port, --coalesce-ms, --scenes-file, --meter-hz, --audio-backend)
+        options = parse_server_options(sys.argv)
+        
         if len(sys.argv) < 2:
             # Default to 'start' when no command is specified (e.g., double-clicking the exe)
             command = 'start'
@@ -183,15 +279,15 @@ def main():
         
         if command == 'start':
             if tray_only:
-                start_gui_with_server_tray_only()
+                start_gui_with_server_tray_only(options)
             else:
-                start_gui_with_server()
+                start_gui_with_server(options)
         elif command == 'server':
-            start_server()
+            start_server(options)
         elif command == 'test':
             test_keyboard()
         elif command == 'gui':
-            start_gui()
+            start_gui(options)
         elif command == 'help':
             show_help()
         else:
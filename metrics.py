@@ -0,0 +1,100 @@
+"""
+In-process metrics in Prometheus text format.
+
+Counts requests and errors per route and keeps latency histograms for routes
+and for internal stages (JSON decode, key lookup, controller calls, holds,
+audio session enumeration, audio worker queue wait, COM calls, peak meter
+sampling). Recording is a bisect and a few additions under a lock, cheap
+enough to leave on.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds (seconds)
+BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_lock = threading.Lock()
+_requests = {}          # (endpoint, method, status) -> count
+_errors = {}            # endpoint -> count of 5xx responses
+_request_latency = {}   # endpoint -> _Histogram
+_stage_latency = {}     # stage -> _Histogram
+
+
+class _Histogram:
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+def observe_request(endpoint, method, status, seconds):
+    """Record one finished HTTP request."""
+    with _lock:
+        key = (endpoint, method, status)
+        _requests[key] = _requests.get(key, 0) + 1
+        if status >= 500:
+            _errors[endpoint] = _errors.get(endpoint, 0) + 1
+        histogram = _request_latency.get(endpoint)
+        if histogram is None:
+            histogram = _request_latency[endpoint] = _Histogram()
+        histogram.observe(seconds)
+
+
+def observe_stage(stage, seconds):
+    """Record the duration of one internal stage."""
+    with _lock:
+        histogram = _stage_latency.get(stage)
+        if histogram is None:
+            histogram = _stage_latency[stage] = _Histogram()
+        histogram.observe(seconds)
+
+
+@contextmanager
+def timed(stage):
+    """Time the enclosed block as `stage` (recorded even if it raises)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _render_histogram(lines, name, label_name, histograms):
+    lines.append(f'# TYPE {name} histogram')
+    for label_value, histogram in sorted(histograms.items()):
+        label = f'{label_name}="{_label(label_value)}"'
+        cumulative = 0
+        for bound, count in zip(BUCKETS, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{label},le="+Inf"}} {histogram.count}')
+        lines.append(f'{name}_sum{{{label}}} {histogram.total:.6f}')
+        lines.append(f'{name}_count{{{label}}} {histogram.count}')
+
+
+def render():
+    """Return all metrics in Prometheus text exposition format."""
+    with _lock:
+        lines = ['# TYPE keyfree_requests_total counter']
+        for (endpoint, method, status), count in sorted(_requests.items()):
+            lines.append(f'keyfree_requests_total{{endpoint="{_label(endpoint)}",method="{method}",status="{status}"}} {count}')
+        lines.append('# TYPE keyfree_request_errors_total counter')
+        for endpoint, count in sorted(_errors.items()):
+            lines.append(f'keyfree_request_errors_total{{endpoint="{_label(endpoint)}"}} {count}')
+        _render_histogram(lines, 'keyfree_request_duration_seconds', 'endpoint', _request_latency)
+        _render_histogram(lines, 'keyfree_stage_duration_seconds', 'stage', _stage_latency)
+    return '\n'.join(lines) + '\n'
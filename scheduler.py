@@ -0,0 +1,86 @@
+"""
+Timer scheduler: runs callbacks at future times from a single thread.
+
+Pending calls live in a heap ordered by due time, so any number of delayed
+actions (key releases, ramps, probes) costs one thread in total.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduledCall:
+    """Handle for a pending call; cancel() stops it from running."""
+    __slots__ = ('when', 'fn', 'args', 'cancelled')
+
+    def __init__(self, when, fn, args):
+        self.when = when
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler:
+    """Heap-based timer. Callbacks run on the scheduler thread and should return quickly."""
+
+    def __init__(self, name='scheduler'):
+        self.name = name
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def call_at(self, when, fn, *args):
+        """Run fn(*args) at time.monotonic() == when. Returns a ScheduledCall."""
+        call = ScheduledCall(when, fn, args)
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name=self.name)
+                self._thread.start()
+            heapq.heappush(self._heap, (when, next(self._seq), call))
+            # Wake the thread only if this is now the earliest call
+            if self._heap[0][2] is call:
+                self._cond.notify()
+        return call
+
+    def call_later(self, delay, fn, *args):
+        """Run fn(*args) after delay seconds. Returns a ScheduledCall."""
+        return self.call_at(time.monotonic() + max(0.0, delay), fn, *args)
+
+    def pending(self):
+        """Number of calls waiting to run (including cancelled ones not yet discarded)."""
+        with self._cond:
+            return len(self._heap)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    when, _seq, call = self._heap[0]
+                    if call.cancelled:
+                        heapq.heappop(self._heap)
+                        continue
+                    delay = when - time.monotonic()
+                    if delay <= 0:
+                        heapq.heappop(self._heap)
+                        break
+                    self._cond.wait(delay)
+            try:
+                call.fn(*call.args)
+            except Exception as e:
+                logger.error(f"Scheduled call {getattr(call.fn, '__name__', call.fn)} failed: {str(e)}")
+
+
+# Shared scheduler for the whole process
+shared = Scheduler()
@@ -1,19 +1,126 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g, copy_current_request_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from keyboard_simulator import KeyboardSimulator
+from keyboard_simulator import KeyboardSimulator, MAX_HOLD, DEFAULT_COMBO_HOLD
 import volume_controller
+import volume_events
+import volume_meters
+import volume_scenes
+import actions
+import ws_server
+import jobs
+import metrics
+import functools
+import threading
+import json
 import logging
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON provider that records request body decode time"""
+    def loads(self, s, **kwargs):
+        with metrics.timed('json_decode'):
+            return super().loads(s, **kwargs)
+
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
 CORS(app)
 
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.before_request
+def fail_fast_while_audio_down():
+    """Answer volume routes with 503 and Retry-After straight away while the audio backend's circuit breaker is open"""
+    if not request.path.startswith('/api/volume/'):
+        return None
+    # Saved scenes can still be listed, read and deleted
+    if request.path.startswith('/api/volume/scenes') and request.method in ('GET', 'DELETE'):
+        return None
+    retry_after = volume_controller.retry_after()
+    if retry_after is None:
+        return None
+    response = jsonify({'error': f'Audio backend is not responding; retry in {retry_after}s', 'retry_after': retry_after})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+@app.after_request
+def record_request_metrics(response):
+    if 'request_start' in g:
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.observe_request(endpoint, request.method, response.status_code, time.perf_counter() - g.request_start)
+    return response
+
 # Initialize keyboard simulator
 keyboard_simulator = KeyboardSimulator()
 
+# Maximum number of steps accepted by /api/batch
+MAX_BATCH_STEPS = 200
+
+# Serving engines accepted by serve(): a waitress WSGI server with a bounded
+# worker pool, or Flask's development server as a fallback
+ENGINES = ('waitress', 'dev')
+DEFAULT_ENGINE = 'waitress'
+DEFAULT_HOST = '0.0.0.0'
+DEFAULT_PORT = 3000
+DEFAULT_THREADS = 8
+
+# Seconds between keep-alive comments on an idle event stream
+SSE_KEEPALIVE = 15
+
+# Share of waitress worker threads that open event streams may hold; further streams get 503
+SSE_MAX_SHARE = 0.5
+
+# Event stream slots: (limit, semaphore), set by serve() for waitress; None = no limit
+_stream_slots = None
+
+def _async_requested():
+    """True if the client asked for async mode (?async=1 or "async": true in the body)"""
+    if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+        return True
+    data = request.get_json(silent=True)
+    return isinstance(data, dict) and data.get('async') is True
+
+def _wait_for_input():
+    """Key routes answer once their events are queued; background jobs wait so their timing covers the injection"""
+    return g.get('background_job', False)
+
+def async_capable(view):
+    """Let an action route run as a background job: respond 202 with a job id when async mode is requested"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not _async_requested():
+            return view(*args, **kwargs)
+        # Read the body now: the server closes the input stream once the 202 is sent
+        request.get_data()
+
+        @copy_current_request_context
+        def run():
+            g.background_job = True
+            response = app.make_response(view(*args, **kwargs))
+            return response.get_json(), response.status_code
+
+        try:
+            job = jobs.submit(run, request.path)
+        except jobs.QueueFull as e:
+            response = jsonify({'error': str(e)})
+            response.status_code = 503
+            response.headers['Retry-After'] = '1'
+            return response
+        return jsonify({
+            'success': True,
+            'job_id': job['id'],
+            'status': job['status'],
+            'status_url': f"/api/jobs/{job['id']}"
+        }), 202
+    return wrapper
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -23,6 +130,11 @@ def health_check():
         'version': '1.2.0'
     })
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Request counts, errors and latency histograms in Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/keys', methods=['GET'])
 def get_available_keys():
     """Get list of available keys"""
@@ -36,6 +148,7 @@ def get_available_keys():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/single', methods=['POST'])
+@async_capable
 def single_key():
     """Send a single key press"""
     try:
@@ -44,7 +157,7 @@ def single_key():
             return jsonify({'error': 'Key parameter is required'}), 400
         
         key = data['key']
-        keyboard_simulator.single(key)
+        keyboard_simulator.single(key, wait=_wait_for_input())
         
         return jsonify({
             'success': True,
@@ -55,6 +168,7 @@ def single_key():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/duo', methods=['POST'])
+@async_capable
 def duo_keys():
     """Send a two-key combination"""
     try:
@@ -64,7 +178,7 @@ def duo_keys():
         
         key1 = data['key1']
         key2 = data['key2']
-        keyboard_simulator.duo(key1, key2)
+        keyboard_simulator.duo(key1, key2, wait=_wait_for_input())
         
         return jsonify({
             'success': True,
@@ -75,6 +189,7 @@ def duo_keys():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/trio', methods=['POST'])
+@async_capable
 def trio_keys():
     """Send a three-key combination"""
     try:
@@ -85,7 +200,7 @@ def trio_keys():
         key1 = data['key1']
         key2 = data['key2']
         key3 = data['key3']
-        keyboard_simulator.trio(key1, key2, key3)
+        keyboard_simulator.trio(key1, key2, key3, wait=_wait_for_input())
         
         return jsonify({
             'success': True,
@@ -96,6 +211,7 @@ def trio_keys():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/quartet', methods=['POST'])
+@async_capable
 def quartet_keys():
     """Send a four-key combination"""
     try:
@@ -107,7 +223,7 @@ def quartet_keys():
         key2 = data['key2']
         key3 = data['key3']
         key4 = data['key4']
-        keyboard_simulator.quartet(key1, key2, key3, key4)
+        keyboard_simulator.quartet(key1, key2, key3, key4, wait=_wait_for_input())
         
         return jsonify({
             'success': True,
@@ -117,26 +233,72 @@ def quartet_keys():
         logger.error(f"Error in quartet keys: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/combo', methods=['POST'])
+@async_capable
+def combo_keys():
+    """Send any number of keys together, or a chord sequence.
+    Body: {"keys": ["ctrl", "shift", "alt", "f13"]} or {"hotkey": "ctrl+k, ctrl+c"}; optional "hold_ms" (default 100).
+    """
+    try:
+        data = request.get_json()
+        if not data or ('keys' not in data and 'hotkey' not in data):
+            return jsonify({'error': '"keys" (list) or "hotkey" (string) is required'}), 400
+        
+        keys = data['hotkey'] if 'hotkey' in data else data['keys']
+        if not isinstance(keys, (str, list)):
+            return jsonify({'error': '"keys" must be a list and "hotkey" a string'}), 400
+        hold = DEFAULT_COMBO_HOLD
+        if data.get('hold_ms') is not None:
+            try:
+                hold = float(data['hold_ms']) / 1000.0
+            except (TypeError, ValueError):
+                return jsonify({'error': 'hold_ms must be a number'}), 400
+            if not 0 <= hold <= MAX_HOLD:
+                return jsonify({'error': f'hold_ms must be between 0 and {int(MAX_HOLD * 1000)}'}), 400
+        try:
+            keyboard_simulator.combo(keys, hold=hold, wait=_wait_for_input())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        label = keys if isinstance(keys, str) else ' + '.join(str(key) for key in keys)
+        return jsonify({
+            'success': True,
+            'message': f'Pressed combo: {label}'
+        })
+    except Exception as e:
+        logger.error(f"Error in combo: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/down', methods=['POST'])
+@async_capable
 def key_down():
-    """Send a key down event"""
+    """Send a key down event. Optional "hold_ms" releases the key automatically after that long."""
     try:
         data = request.get_json()
         if not data or 'key' not in data:
             return jsonify({'error': 'Key parameter is required'}), 400
         
         key = data['key']
-        keyboard_simulator.down(key)
+        hold = None
+        if data.get('hold_ms') is not None:
+            try:
+                hold = float(data['hold_ms']) / 1000.0
+            except (TypeError, ValueError):
+                return jsonify({'error': 'hold_ms must be a number'}), 400
+            if not 0 <= hold <= MAX_HOLD:
+                return jsonify({'error': f'hold_ms must be between 0 and {int(MAX_HOLD * 1000)}'}), 400
+        keyboard_simulator.down(key, hold=hold, wait=_wait_for_input())
         
         return jsonify({
             'success': True,
-            'message': f'Key down: {key}'
+            'message': f'Key down: {key}' + (f' (release in {data["hold_ms"]}ms)' if hold is not None else '')
         })
     except Exception as e:
         logger.error(f"Error in key down: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/up', methods=['POST'])
+@async_capable
 def key_up():
     """Send a key up event"""
     try:
@@ -145,7 +307,7 @@ def key_up():
             return jsonify({'error': 'Key parameter is required'}), 400
         
         key = data['key']
-        keyboard_simulator.up(key)
+        keyboard_simulator.up(key, wait=_wait_for_input())
         
         return jsonify({
             'success': True,
@@ -156,40 +318,162 @@ def key_up():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/string', methods=['POST'])
+@async_capable
 def type_string():
-    """Type a string"""
+    """Type a string. Optional "mode" ("auto", "type" or "paste") and "cps" (typing rate, characters per second)."""
     try:
         data = request.get_json()
         if not data or 'text' not in data:
             return jsonify({'error': 'Text parameter is required'}), 400
         
         text = data['text']
-        keyboard_simulator.type_string(text)
+        cps = None
+        if data.get('cps') is not None:
+            try:
+                cps = float(data['cps'])
+            except (TypeError, ValueError):
+                return jsonify({'error': 'cps must be a number'}), 400
+        try:
+            mode = keyboard_simulator.type_string(text, mode=data.get('mode', 'auto'), cps=cps, wait=_wait_for_input())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         return jsonify({
             'success': True,
-            'message': f'Typed string: {text}'
+            'message': f'Typed string: {text}',
+            'mode': mode
         })
     except Exception as e:
         logger.error(f"Error in type string: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/batch', methods=['POST'])
+@async_capable
+def run_batch():
+    """Run an ordered list of steps. Body: {"steps": [{"action": "duo", "key1": "ctrl", "key2": "c"}, {"action": "wait", "ms": 100}, ...]}.
+    Every step is validated before any of them runs; execution stops at the first failing step.
+    """
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('steps'), list) or not data['steps']:
+            return jsonify({'error': '"steps" must be a non-empty list'}), 400
+        steps = data['steps']
+        if len(steps) > MAX_BATCH_STEPS:
+            return jsonify({'error': f'At most {MAX_BATCH_STEPS} steps are allowed'}), 400
+        for index, step in enumerate(steps):
+            try:
+                actions.validate(step, keyboard_simulator)
+            except actions.ActionError as e:
+                return jsonify({'error': str(e), 'step': index}), 400
+
+        results = []
+        for index, step in enumerate(steps):
+            try:
+                results.append(actions.run(step, keyboard_simulator))
+            except Exception as e:
+                logger.error(f"Error in batch step {index}: {str(e)}")
+                return jsonify({'error': str(e), 'step': index, 'results': results}), 500
+
+        return jsonify({
+            'success': True,
+            'message': f'Ran {len(results)} step(s)',
+            'results': results
+        })
+    except Exception as e:
+        logger.error(f"Error in batch: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get status and timing of a background job started with async mode"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Job not found: {job_id}'}), 404
+    return jsonify(job)
+
 
 # --- Volume (per-app) API ---
 
 @app.route('/api/volume/apps', methods=['GET'])
 def volume_list_apps():
-    """List apps with active audio sessions (name, pid, volume, muted)."""
+    """List apps with active audio sessions (name, pid, volume, muted), grouped per name, with a version.
+    ?since=<version> returns only the groups changed or removed since then.
+    """
     if not volume_controller.is_available():
         return jsonify({'error': 'Per-app volume control is not available (Windows + pycaw required)'}), 503
     try:
-        apps = volume_controller.get_audio_sessions()
-        return jsonify({'apps': apps})
+        since = request.args.get('since')
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                return jsonify({'error': 'since must be an integer version'}), 400
+        return jsonify(volume_controller.get_app_groups(since))
     except Exception as e:
         logger.error(f"Error listing volume apps: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
+def _event_stream(subscribe, what, dumps):
+    """
+    Serve a subscription as server-sent events. Each stream holds a worker for
+    its whole life, so only _stream_slots of them may be open at once.
+    """
+    slots = _stream_slots
+    if slots is not None and not slots[1].acquire(blocking=False):
+        return jsonify({'error': f'Too many open event streams (at most {slots[0]}); '
+                                 f'use the WebSocket subscription or raise --threads'}), 503
+    try:
+        subscription = subscribe()
+    except Exception as e:
+        if slots is not None:
+            slots[1].release()
+        logger.error(f"Error subscribing to {what}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+    def stream():
+        while True:
+            message = subscription.get(timeout=SSE_KEEPALIVE)
+            if message is None:
+                yield ': keep-alive\n\n'
+            else:
+                yield f"event: {message['event']}\ndata: {dumps(message)}\n\n"
+
+    released = []
+
+    def close():
+        # Runs when the server closes the response, also if the stream never started
+        subscription.close()
+        if slots is not None and not released:
+            released.append(True)
+            slots[1].release()
+
+    response = Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+    response.call_on_close(close)
+    return response
+
+
+@app.route('/api/volume/events', methods=['GET'])
+def volume_events_stream():
+    """Server-sent events: a "snapshot" event with all apps and the master, then "changed" events
+    with only the apps (name, pid, volume, muted), removed apps and master state that changed.
+    """
+    if not volume_controller.is_available():
+        return jsonify({'error': 'Volume control is not available (Windows + pycaw required)'}), 503
+    return _event_stream(volume_events.subscribe, 'volume events', json.dumps)
+
+
+@app.route('/api/volume/meters', methods=['GET'])
+def volume_meters_stream():
+    """Server-sent events: a "snapshot" event with the peak level (0-100) of every app (by PID) and the master,
+    then "meters" events with only the levels that changed. Sampling runs only while someone is subscribed.
+    """
+    if not volume_controller.is_available():
+        return jsonify({'error': 'Volume control is not available (Windows + pycaw required)'}), 503
+    return _event_stream(volume_meters.subscribe, 'volume meters',
+                         lambda message: json.dumps(message, separators=(',', ':')))
+
+
 @app.route('/api/volume/get', methods=['GET', 'POST'])
 def volume_get():
     """Get current volume level (0.0-1.0) and mute state for an app.
@@ -222,6 +506,7 @@ def volume_get():
 
 
 @app.route('/api/volume/set', methods=['POST'])
+@async_capable
 def volume_set():
     """Set volume for an app. Body: {"app": "chrome.exe", "volume": 0.8} or {"pid": 1234, "volume": 0.5}. volume in 0.0-1.0."""
     if not volume_controller.is_available():
@@ -248,6 +533,7 @@ def volume_set():
 
 
 @app.route('/api/volume/up', methods=['POST'])
+@async_capable
 def volume_up():
     """Increase volume for an app. Body: {"app": "chrome.exe"} or {"app": "chrome.exe", "amount": 0.1}. amount default 0.1."""
     if not volume_controller.is_available():
@@ -273,6 +559,7 @@ def volume_up():
 
 
 @app.route('/api/volume/down', methods=['POST'])
+@async_capable
 def volume_down():
     """Decrease volume for an app. Body: {"app": "chrome.exe"} or {"app": "chrome.exe", "amount": 0.1}."""
     if not volume_controller.is_available():
@@ -298,6 +585,7 @@ def volume_down():
 
 
 @app.route('/api/volume/mute', methods=['POST'])
+@async_capable
 def volume_mute():
     """Mute an app. Body: {"app": "chrome.exe"} or {"pid": 1234}."""
     if not volume_controller.is_available():
@@ -322,6 +610,7 @@ def volume_mute():
 
 
 @app.route('/api/volume/unmute', methods=['POST'])
+@async_capable
 def volume_unmute():
     """Unmute an app. Body: {"app": "chrome.exe"} or {"pid": 1234}."""
     if not volume_controller.is_available():
@@ -346,6 +635,7 @@ def volume_unmute():
 
 
 @app.route('/api/volume/toggle-mute', methods=['POST'])
+@async_capable
 def volume_toggle_mute():
     """Toggle mute for an app. Body: {"app": "chrome.exe"} or {"pid": 1234}. Returns new muted state."""
     if not volume_controller.is_available():
@@ -387,6 +677,7 @@ def volume_master_get():
 
 
 @app.route('/api/volume/master/set', methods=['POST'])
+@async_capable
 def volume_master_set():
     """Set system master volume. Body: {"volume": 0.0-1.0}."""
     if not volume_controller.is_available():
@@ -405,6 +696,7 @@ def volume_master_set():
 
 
 @app.route('/api/volume/master/up', methods=['POST'])
+@async_capable
 def volume_master_up():
     """Increase system master volume. Body: optional {"amount": 0.1}. Default step 0.1."""
     if not volume_controller.is_available():
@@ -422,6 +714,7 @@ def volume_master_up():
 
 
 @app.route('/api/volume/master/down', methods=['POST'])
+@async_capable
 def volume_master_down():
     """Decrease system master volume. Body: optional {"amount": 0.1}. Default step 0.1."""
     if not volume_controller.is_available():
@@ -439,6 +732,7 @@ def volume_master_down():
 
 
 @app.route('/api/volume/master/mute', methods=['POST'])
+@async_capable
 def volume_master_mute():
     """Mute system master volume."""
     if not volume_controller.is_available():
@@ -454,6 +748,7 @@ def volume_master_mute():
 
 
 @app.route('/api/volume/master/unmute', methods=['POST'])
+@async_capable
 def volume_master_unmute():
     """Unmute system master volume."""
     if not volume_controller.is_available():
@@ -469,6 +764,7 @@ def volume_master_unmute():
 
 
 @app.route('/api/volume/master/toggle-mute', methods=['POST'])
+@async_capable
 def volume_master_toggle_mute():
     """Toggle system master mute. Returns new muted state."""
     if not volume_controller.is_available():
@@ -483,6 +779,233 @@ def volume_master_toggle_mute():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/volume/fade', methods=['POST'])
+def volume_fade():
+    """Fade an app or the master to a level on the server.
+    Body: {"app": "spotify.exe", "volume": 0.1, "duration_ms": 2000, "curve": "log"} or {"master": true, ...}.
+    curve: linear (default) or log. Returns straight away; a new fade on the same target replaces a running one.
+    """
+    if not volume_controller.is_available():
+        return jsonify({'error': 'Volume control is not available (Windows + pycaw required)'}), 503
+    try:
+        data = request.get_json() or {}
+        step = dict(data, action='volume/fade')
+        try:
+            actions.validate(step, keyboard_simulator)
+        except actions.ActionError as e:
+            return jsonify({'error': str(e)}), 400
+        try:
+            return jsonify(actions.run(step, keyboard_simulator))
+        except actions.ActionError as e:
+            return jsonify({'error': str(e)}), 500 if data.get('master') is True else 404
+    except Exception as e:
+        logger.error(f"Error starting fade: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/volume/bulk', methods=['POST'])
+@async_capable
+def volume_bulk():
+    """Apply many volume operations from one session snapshot.
+    Body: {"ops": [{"op": "set", "app": "chrome.exe", "volume": 0.5}, {"op": "mute", "all_except": ["discord.exe"]},
+                   {"op": "delta", "master": true, "amount": -0.1}, ...]}
+    op: set, delta, mute, unmute, toggle. Target: "app", "pid", "master": true or "all_except": [...].
+    Returns per-operation results; "success" is false if any operation failed.
+    """
+    if not volume_controller.is_available():
+        return jsonify({'error': 'Volume control is not available (Windows + pycaw required)'}), 503
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('ops'), list) or not data['ops']:
+            return jsonify({'error': '"ops" must be a non-empty list'}), 400
+        ops = data['ops']
+        if len(ops) > actions.MAX_BULK_OPS:
+            return jsonify({'error': f'At most {actions.MAX_BULK_OPS} operations are allowed'}), 400
+        for index, op in enumerate(ops):
+            try:
+                actions.validate_bulk_op(op)
+            except actions.ActionError as e:
+                return jsonify({'error': str(e), 'op': index}), 400
+        results = volume_controller.apply_bulk(ops)
+        return jsonify({'success': all(result['success'] for result in results), 'results': results})
+    except Exception as e:
+        logger.error(f"Error applying bulk volume operations: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/volume/scenes', methods=['GET'])
+def volume_list_scenes():
+    """List saved volume scenes (name, saved time, number of apps)."""
+    try:
+        return jsonify({'scenes': volume_scenes.list_scenes()})
+    except Exception as e:
+        logger.error(f"Error listing scenes: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/volume/scenes', methods=['POST'])
+def volume_save_scene():
+    """Save the current app and master levels as a named scene.
+    Body: {"name": "gaming"}. Replaces a scene of the same name.
+    """
+    if not volume_controller.is_available():
+        return jsonify({'error': 'Volume control is not available (Windows + pycaw required)'}), 503
+    try:
+        data = request.get_json() or {}
+        if not volume_scenes.valid_name(data.get('name')):
+            return jsonify({'error': f'"name" must be a non-empty string of at most {volume_scenes.MAX_SCENE_NAME} characters'}), 400
+        scene = volume_scenes.save_scene(data['name'])
+        return jsonify({'success': True, 'message': f"Saved scene {scene['name']} ({len(scene['apps'])} apps)", 'scene': scene})
+    except Exception as e:
+        logger.error(f"Error saving scene: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/volume/scenes/<name>', methods=['GET'])
+def volume_get_scene(name):
+    """Get a saved scene's app and master levels."""
+    try:
+        scene = volume_scenes.get_scene(name)
+        if scene is None:
+            return jsonify({'error': f'Scene not found: {name}'}), 404
+        return jsonify(scene)
+    except Exception as e:
+        logger.error(f"Error reading scene: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/volume/scenes/<name>', methods=['DELETE'])
+def volume_delete_scene(name):
+    """Delete a saved scene."""
+    try:
+        if not volume_scenes.delete_scene(name):
+            return jsonify({'error': f'Scene not found: {name}'}), 404
+        return jsonify({'success': True, 'message': f'Deleted scene {name}'})
+    except Exception as e:
+        logger.error(f"Error deleting scene: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/volume/scenes/<name>/restore', methods=['POST'])
+@async_capable
+def volume_restore_scene(name):
+    """Restore a saved scene in one pass.
+    Body (optional): {"duration_ms": 1500, "curve": "log", "master": false}.
+    duration_ms fades volumes instead of setting them; master: false leaves the master alone.
+    The response lists apps of the scene that aren't running in "missing".
+    """
+    if not volume_controller.is_available():
+        return jsonify({'error': 'Volume control is not available (Windows + pycaw required)'}), 503
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            duration, curve = actions.fade_options(data, required=False)
+        except actions.ActionError as e:
+            return jsonify({'error': str(e)}), 400
+        result = volume_scenes.restore_scene(name, duration, curve or 'linear', data.get('master', True) is not False)
+        if result is None:
+            return jsonify({'error': f'Scene not found: {name}'}), 404
+        return jsonify(result)
+    except Exception as e:
+        logger.error(f"Error restoring scene: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+# --- Audio devices API ---
+
+@app.route('/api/volume/devices', methods=['GET'])
+def volume_list_devices():
+    """List active playback ("render") and recording ("capture") devices: id, name, flow, default.
+    ?flow=render or ?flow=capture limits the list. Served from a cached device index.
+    """
+    if not volume_controller.is_available():
+        return jsonify({'error': 'Volume control is not available (Windows + pycaw required)'}), 503
+    try:
+        flow = request.args.get('flow')
+        if flow is not None and flow not in volume_controller.DEVICE_FLOWS:
+            return jsonify({'error': f'flow must be one of: {", ".join(volume_controller.DEVICE_FLOWS)}'}), 400
+        devices = volume_controller.get_devices(flow)
+        if devices is None:
+            return jsonify({'error': 'Audio devices not available'}), 503
+        return jsonify({'devices': devices})
+    except Exception as e:
+        logger.error(f"Error listing audio devices: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/volume/devices/default', methods=['POST'])
+@async_capable
+def volume_set_default_device():
+    """Switch the default device of a device's direction. Body: {"device": "Headphones"} (id or name)."""
+    if not volume_controller.is_available():
+        return jsonify({'error': 'Volume control is not available (Windows + pycaw required)'}), 503
+    try:
+        data = request.get_json() or {}
+        if not data.get('device'):
+            return jsonify({'error': '"device" (id or name) is required'}), 400
+        success, message = volume_controller.set_default_device(data['device'])
+        if not success:
+            return jsonify({'error': message}), 404
+        return jsonify({'success': True, 'message': message})
+    except Exception as e:
+        logger.error(f"Error setting default device: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/volume/device/get', methods=['GET', 'POST'])
+def volume_device_get():
+    """Get volume (0.0-1.0) and mute state of a device.
+    GET: ?device=Speakers  POST: body {"device": "Speakers"} (id or name)
+    Returns: {"id", "name", "flow", "default", "volume", "muted"}
+    """
+    if not volume_controller.is_available():
+        return jsonify({'error': 'Volume control is not available (Windows + pycaw required)'}), 503
+    try:
+        if request.method == 'GET':
+            data = request.args
+        else:
+            data = request.get_json() or {}
+        if not data.get('device'):
+            return jsonify({'error': '"device" (id or name) is required'}), 400
+        info, message = volume_controller.get_device_volume(data['device'])
+        if info is None:
+            return jsonify({'error': message}), 404
+        return jsonify(info)
+    except Exception as e:
+        logger.error(f"Error getting device volume: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/volume/device/set', methods=['POST'])
+@async_capable
+def volume_device_set():
+    """Set volume and/or mute of a device. Body: {"device": "Headphones", "volume": 0.4, "muted": false}."""
+    if not volume_controller.is_available():
+        return jsonify({'error': 'Volume control is not available (Windows + pycaw required)'}), 503
+    try:
+        data = request.get_json() or {}
+        if not data.get('device'):
+            return jsonify({'error': '"device" (id or name) is required'}), 400
+        if 'volume' not in data and 'muted' not in data:
+            return jsonify({'error': '"volume" (0.0 to 1.0) and/or "muted" is required'}), 400
+        volume = None
+        if data.get('volume') is not None:
+            try:
+                volume = float(data['volume'])
+            except (TypeError, ValueError):
+                return jsonify({'error': '"volume" must be a number from 0.0 to 1.0'}), 400
+        muted = data.get('muted')
+        if muted is not None and not isinstance(muted, bool):
+            return jsonify({'error': '"muted" must be true or false'}), 400
+        success, message = volume_controller.set_device_volume(data['device'], volume, muted)
+        if not success:
+            return jsonify({'error': message}), 404
+        return jsonify({'success': True, 'message': message})
+    except Exception as e:
+        logger.error(f"Error setting device volume: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
 @app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
@@ -493,10 +1016,36 @@ def internal_error(error):
     """Handle 500 errors"""
     return jsonify({'error': 'Internal server error'}), 500
 
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, engine=DEFAULT_ENGINE, threads=DEFAULT_THREADS):
+    """
+    Serve the API until the process exits.
+    engine: "waitress" (bounded pool of `threads` workers, HTTP/1.1 keep-alive) or "dev".
+    Falls back to the development server if waitress is not installed.
+    """
+    global _stream_slots
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine} (expected one of {', '.join(ENGINES)})")
+    if engine == 'waitress':
+        try:
+            from waitress import serve as waitress_serve
+        except ImportError:
+            logger.warning("waitress is not installed; falling back to the Flask development server")
+        else:
+            # Event streams never take more than their share of the pool
+            limit = int(threads * SSE_MAX_SHARE)
+            _stream_slots = (limit, threading.BoundedSemaphore(limit))
+            logger.info(f"Serving on {host}:{port} with waitress ({threads} threads)")
+            waitress_serve(app, host=host, port=port, threads=threads, ident='KeyFree Companion')
+            return
+    app.run(host=host, port=port, debug=False, threaded=True, use_reloader=False)
+
 if __name__ == '__main__':
     print("KeyFree Companion API server starting...")
-    print("Health check: http://localhost:3000/health")
-    print("API documentation: http://localhost:3000/api/keys")
+    print(f"Health check: http://localhost:{DEFAULT_PORT}/health")
+    print(f"API documentation: http://localhost:{DEFAULT_PORT}/api/keys")
+    print(f"WebSocket commands: ws://localhost:{ws_server.DEFAULT_WS_PORT}")
+    
+    ws_server.start(keyboard_simulator)
     
-    # Run the Flask app
-    app.run(host='0.0.0.0', port=3000, debug=False)
+    # Run the API server
+    serve()
@@ -0,0 +1,165 @@
+"""
+Volume control against FakeAudioBackend: session caching, coalescing, bulk
+operations, versioned app groups and the circuit breaker. Runs on any OS.
+"""
+
+import threading
+import time
+
+import pytest
+
+import audio_backends
+import volume_controller
+import volume_events
+from circuit_breaker import CircuitOpenError
+
+
+@pytest.fixture
+def backend():
+    """A fresh fake with notifications, used through a breaker that probes quickly."""
+    fake = audio_backends.FakeAudioBackend(sessions=[
+        (10, 'chrome.exe', 0.5, False),
+        (11, 'chrome.exe', 0.5, False),
+        (20, 'Discord.exe', 0.8, False),
+        (30, 'vlc.exe', 1.0, False),
+    ])
+    window = volume_controller.COALESCE_WINDOW
+    volume_controller.set_backend(audio_backends.GuardedBackend(fake, probe_interval=0.05, max_probe_interval=0.05))
+    volume_controller.set_coalesce_window(0)
+    yield fake
+    volume_controller.set_coalesce_window(window)
+
+
+def _volumes(name):
+    return sorted(app['volume'] for app in volume_controller.get_audio_sessions() if app['name'] == name)
+
+
+def test_sessions_are_enumerated_once_with_notifications(backend):
+    for _ in range(5):
+        assert volume_controller.get_volume('discord.exe') == {'volume': 0.8, 'muted': False}
+    assert backend.calls['list_sessions'] == 1
+
+
+def test_coalesced_steps_cost_one_write_per_session(backend):
+    volume_controller.set_coalesce_window(0.05)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(volume_controller.volume_up('chrome.exe', 0.05)))
+               for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(success for success, _message in results)
+    # Six steps summed into one change for each of the two chrome sessions
+    assert backend.calls['session_set'] == 2
+    assert _volumes('chrome.exe') == [0.8, 0.8]
+
+
+def test_coalesced_steps_are_not_lost_when_applies_are_slow():
+    # Each write takes 2 ms, so applying a batch outlasts the 5 ms window
+    fake = audio_backends.FakeAudioBackend(sessions=[(100 + i, 'chrome.exe', 0.0, False) for i in range(6)],
+                                           latency=0.002)
+    window = volume_controller.COALESCE_WINDOW
+    volume_controller.set_backend(fake)
+    volume_controller.set_coalesce_window(0.005)
+    try:
+        volume_controller.get_audio_sessions()
+        threads = []
+        for _ in range(40):
+            thread = threading.Thread(target=volume_controller.volume_up, args=('chrome.exe', 0.01))
+            thread.start()
+            threads.append(thread)
+            time.sleep(0.003)
+        for thread in threads:
+            thread.join()
+    finally:
+        volume_controller.set_coalesce_window(window)
+    assert _volumes('chrome.exe') == [0.4] * 6
+
+
+def test_bulk_all_except(backend):
+    results = volume_controller.apply_bulk([{'op': 'set', 'all_except': ['chrome.exe', 30], 'volume': 0.2}])
+    assert results[0]['success']
+    assert _volumes('chrome.exe') == [0.5, 0.5]
+    assert _volumes('Discord.exe') == [0.2]
+    assert _volumes('vlc.exe') == [1.0]
+
+
+def test_bulk_reports_missing_apps(backend):
+    results = volume_controller.apply_bulk([{'op': 'mute', 'app': 'nope.exe'}, {'op': 'mute', 'pid': 20}])
+    assert results[0]['missing'] and not results[0]['success']
+    assert results[1]['success']
+
+
+def test_app_group_deltas(backend):
+    version = volume_controller.get_app_groups()['version']
+    backend.add_session(40, 'spotify.exe', 0.3)
+    delta = volume_controller.get_app_groups(version)
+    assert [group['name'] for group in delta['changed']] == ['spotify.exe']
+    assert delta['removed'] == []
+
+    version = delta['version']
+    backend.remove_session(next(s.key for s in backend.list_sessions() if s.name == 'vlc.exe'))
+    delta = volume_controller.get_app_groups(version)
+    assert delta['changed'] == [] and delta['removed'] == ['vlc.exe']
+
+
+def test_failed_read_does_not_touch_app_group_versions(backend):
+    version = volume_controller.get_app_groups()['version']
+    volume_controller._invalidate_model()
+    backend.fail_calls(1)
+    with pytest.raises(audio_backends.FakeAudioError):
+        volume_controller.get_app_groups()
+    delta = volume_controller.get_app_groups(version)
+    assert delta['version'] == version
+    assert delta['changed'] == [] and delta['removed'] == []
+
+
+def test_failed_read_publishes_no_removals():
+    fake = audio_backends.FakeAudioBackend(sessions=[(10, 'chrome.exe', 0.5, False)], notifications=False)
+    volume_controller.set_backend(fake)
+    subscription = volume_events.subscribe()
+    try:
+        assert subscription.get(timeout=1)['event'] == 'snapshot'
+        volume_controller._invalidate_model()
+        fake.fail_calls(1)
+        volume_events._mark_dirty()
+        # The failed read is skipped and the next poll finds nothing changed
+        assert subscription.get(timeout=volume_events.POLL_INTERVAL * 1.5) is None
+    finally:
+        subscription.close()
+
+
+def test_breaker_trips_and_recovers(backend):
+    volume_controller.get_audio_sessions()
+    backend.fail_calls(3)
+    for _ in range(3):
+        assert not volume_controller.set_master_volume(0.5)[0]
+    assert volume_controller.retry_after() is not None
+
+    # Refused without reaching the backend
+    calls = sum(backend.calls.values())
+    with pytest.raises(CircuitOpenError):
+        volume_controller._backend.get_master()
+    assert sum(backend.calls.values()) == calls
+
+    deadline = time.monotonic() + 2.0
+    while volume_controller.retry_after() is not None and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert volume_controller.retry_after() is None
+    assert volume_controller.set_master_volume(0.4)[0]
+    assert volume_controller.get_master_volume() == {'volume': 0.4, 'muted': False}
+    # Recovery drops the session model and re-registers notifications
+    assert len(volume_controller.get_audio_sessions()) == 4
+    assert volume_controller.notifications_active()
+
+
+def test_devices_from_cached_index(backend):
+    for _ in range(3):
+        assert [d['name'] for d in volume_controller.get_devices('render')] == ['Speakers', 'Headphones']
+    assert backend.calls['device_list'] == 1
+
+    assert volume_controller.set_default_device('headphones')[0]
+    assert volume_controller.get_devices('render')[1]['default']
+    backend.add_device('fake-usb', 'USB DAC', 'render')
+    assert [d['name'] for d in volume_controller.get_devices('render')][-1] == 'USB DAC'
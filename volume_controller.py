@@ -1,79 +1,360 @@
 """
-Per-application volume control using Windows Core Audio (pycaw).
-Windows only.
+Per-application and master volume control.
+Uses Windows Core Audio (pycaw) by default; see audio_backends for the backend
+interface and the in-memory fake used on other platforms. Playback and
+recording devices are served from a cached index (see get_devices()). The backend sits
+behind a circuit breaker: while it is open, calls fail at once (see retry_after()).
 """
 
-import sys
+import math
+import time
 import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import metrics
+import scheduler
+import audio_backends
+from audio_backends import (SESSION_ADDED, SESSION_REMOVED, SESSION_CHANGED, MASTER_CHANGED, DEFAULT_DEVICE_CHANGED,
+                            BACKEND_RECOVERED, DEVICES_CHANGED, DEVICE_FLOWS)
+from circuit_breaker import CircuitOpenError
 
 logger = logging.getLogger(__name__)
 
 # Default volume step (0.0 to 1.0)
 DEFAULT_VOLUME_STEP = 0.1
 
-_pycaw_available = False
-try:
-    if sys.platform == "win32":
-        import comtypes
-        from pycaw.pycaw import AudioUtilities
-        _pycaw_available = True
-except ImportError:
-    pass
+# How long the session model is trusted before sessions are enumerated again (seconds).
+# Only used when the backend cannot deliver session notifications.
+SESSION_INDEX_TTL = 2.0
+
+# Same for the device index, when the backend cannot report device changes (seconds)
+DEVICE_INDEX_TTL = 10.0
+
+# Relative changes (up/down) to the same target that arrive within this window
+# are summed and applied as one change (seconds; 0 applies each one on its own)
+COALESCE_WINDOW = 0.005
+
+# Fades: time between ramp steps, longest accepted duration (seconds), and curves.
+# "log" ramps in decibels, treating anything below FADE_FLOOR_DB as silence.
+FADE_STEP_INTERVAL = 0.025
+MAX_FADE_DURATION = 60.0
+FADE_CURVES = ('linear', 'log')
+FADE_FLOOR_DB = -60.0
+
+# Removed app groups remembered for ?since= deltas; older versions get a full list
+MAX_REMOVED_GROUPS = 256
+
+# Backend used for all volume calls, behind a circuit breaker; see set_backend()
+_backend = audio_backends.GuardedBackend(audio_backends.PycawBackend())
+
+# Session model: {"built", "live", "sessions", "by_name", "by_pid"}; see _get_model()
+_model = None
+_model_lock = threading.RLock()
+
+# Device index: {"built", "live", "devices", "by_id", "by_name", "defaults"}; see _get_devices().
+# Guarded by _model_lock and dropped on device change notifications.
+_devices = None
+
+# Master state {"volume", "muted"}, cached only while notifications keep it current
+_master = None
+
+# Whether backend notifications keep the model current (None = not started yet)
+_notifications = None
+
+# Callables run after any known session or master state changes; see add_change_listener()
+_change_listeners = []
+
+# Relative changes being collected: target -> {"delta", "requests", "future"}; see _coalesced()
+_coalescing = {}
+_coalescing_lock = threading.Lock()
+
+# Per-target lock held across each apply, so one target's read-modify-writes never overlap:
+# target -> [lock, threads using it]; guarded by _coalescing_lock
+_apply_locks = {}
 
+# Versioned per-name view of the app list; see get_app_groups(). Versions start
+# from the current time in ms so versions from a previous run fall below the floor.
+_groups = {}                     # name key -> {"group", "version"}
+_removed_groups = OrderedDict()  # name key -> {"name", "version"}
+_groups_version = int(time.time() * 1000)
+_groups_floor = _groups_version  # deltas need since >= this
+_groups_lock = threading.Lock()
 
-def _ensure_com_initialized():
-    """Initialize COM for the current thread (required for pycaw on Windows)."""
-    if not _pycaw_available:
+# Running fades: target -> fade dict; see _start_fade(). All fades share one timer thread.
+_fades = {}
+_fades_lock = threading.Lock()
+_fade_timer = scheduler.Scheduler('volume-fades')
+
+
+def is_available():
+    """Return True if volume control is available (Windows + pycaw, or a fake backend)."""
+    return _backend is not None and _backend.is_available()
+
+
+def set_backend(backend):
+    """
+    Use backend (an audio_backends.AudioBackend) for all volume calls, e.g. a
+    FakeAudioBackend to run the volume API without Windows. Drops the session model.
+    The backend is wrapped in a GuardedBackend unless it already is one.
+    """
+    global _backend, _model, _devices, _master, _notifications
+    if not isinstance(backend, audio_backends.GuardedBackend):
+        backend = audio_backends.GuardedBackend(backend)
+    with _model_lock:
+        _backend = backend
+        _model = None
+        _devices = None
+        _master = None
+        _notifications = None
+    _changed()
+
+
+def retry_after():
+    """Seconds until the audio backend is probed again while its circuit breaker is open, else None."""
+    return _backend.breaker.retry_after()
+
+
+def _log_failure(what, error):
+    """
+    Log a failed volume call: a traceback for the first backend failure in a row,
+    one line for the next ones, nothing while the breaker refuses calls.
+    """
+    if isinstance(error, CircuitOpenError):
         return
+    if _backend.breaker.failures <= 1:
+        logger.exception("%s failed: %s", what, error)
+    else:
+        logger.warning("%s failed: %s", what, error)
+
+
+def notifications_active():
+    """True if backend notifications keep session and master state current (no polling needed)."""
+    return bool(_notifications)
+
+
+def add_change_listener(listener):
+    """
+    Call listener() whenever known session or master state changes (our own
+    writes, or backend notifications). It runs on the changing thread and must return quickly.
+    """
+    _change_listeners.append(listener)
+
+
+def _changed():
+    for listener in _change_listeners:
+        try:
+            listener()
+        except Exception as e:
+            logger.debug("Change listener failed: %s", e)
+
+
+def _record(entry, volume=None, muted=None):
+    """Store a session's new volume and/or mute state in the model."""
+    if volume is not None:
+        entry["info"]["volume"] = round(volume, 3)
+    if muted is not None:
+        entry["info"]["muted"] = bool(muted)
+    _changed()
+
+
+def set_coalesce_window(seconds):
+    """Set COALESCE_WINDOW (seconds; 0 disables coalescing)."""
+    global COALESCE_WINDOW
+    COALESCE_WINDOW = max(0.0, float(seconds))
+
+
+def _coalesced(target, delta, apply):
+    """
+    Sum relative changes to target that arrive within COALESCE_WINDOW and run
+    apply(total_delta) once for all of them. The first caller waits out the
+    window and applies; every caller gets apply's return value (or exception).
+    Applies to one target run one at a time: a batch that closes while the
+    previous apply is still running keeps collecting until it can go.
+    """
+    if COALESCE_WINDOW <= 0:
+        with _applying(target):
+            return apply(delta)
+    with _coalescing_lock:
+        batch = _coalescing.get(target)
+        leader = batch is None
+        if leader:
+            batch = _coalescing[target] = {"delta": 0.0, "requests": 0, "future": Future()}
+        batch["delta"] += delta
+        batch["requests"] += 1
+    if not leader:
+        return batch["future"].result()
+    time.sleep(COALESCE_WINDOW)
+    with _applying(target):
+        with _coalescing_lock:
+            del _coalescing[target]
+        if batch["requests"] > 1:
+            logger.debug("Coalesced %d volume changes for %s", batch["requests"], target)
+        try:
+            result = apply(batch["delta"])
+        except Exception as e:
+            batch["future"].set_exception(e)
+            raise
+    batch["future"].set_result(result)
+    return result
+
+
+@contextmanager
+def _applying(target):
+    """Hold target's apply lock; the lock is dropped once no thread uses it."""
+    with _coalescing_lock:
+        entry = _apply_locks.setdefault(target, [threading.Lock(), 0])
+        entry[1] += 1
     try:
-        comtypes.CoInitialize()
-    except Exception as e:
-        logger.debug("CoInitialize: %s", e)
+        with entry[0]:
+            yield
+    finally:
+        with _coalescing_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _apply_locks[target]
+
+
+def _on_backend_event(backend, event, payload):
+    """Apply one backend notification to the session model."""
+    global _model, _devices, _master, _notifications
+    entry = _make_entry(payload) if event == SESSION_ADDED else None
+    with _model_lock:
+        if backend is not _backend:
+            return
+        if event == MASTER_CHANGED:
+            level, muted = payload
+            _master = {"volume": round(level, 3), "muted": bool(muted)}
+        elif event == DEVICES_CHANGED:
+            _devices = None
+            return
+        elif event == DEFAULT_DEVICE_CHANGED:
+            # Sessions and master belong to the old device
+            logger.info("Default playback device changed")
+            _model = None
+            _devices = None
+            _master = None
+        elif event == BACKEND_RECOVERED:
+            # Whatever was tracked before the outage may be stale; notifications may be dead
+            _model = None
+            _devices = None
+            _master = None
+            _notifications = None
+        elif _model is None:
+            return
+        elif event == SESSION_ADDED:
+            _remove_entry(_model, entry["session"].key)
+            _add_entry(_model, entry)
+        elif event == SESSION_REMOVED:
+            _remove_entry(_model, payload)
+        elif event == SESSION_CHANGED:
+            key, level, muted = payload
+            changed = _model["sessions"].get(key)
+            if changed is not None:
+                _record(changed, volume=level, muted=muted)
+                return
+        _changed()
 
 
-def _session_to_info(session):
-    """Build a dict for one audio session for API/GUI."""
+def _make_entry(session):
+    """Build a model entry for one audio session: {"session", "info"}."""
     try:
-        vol = session.SimpleAudioVolume
-        level = vol.GetMasterVolume()
-        muted = vol.GetMute()
+        level = session.get_volume()
+        muted = session.get_mute()
     except Exception as e:
         logger.debug("Session volume read failed: %s", e)
         level = 0.0
         muted = False
-
-    name = "System"
-    pid = getattr(session, "ProcessId", None) or 0
-    if session.Process is not None:
-        try:
-            name = session.Process.name()
-        except Exception:
-            name = f"PID {pid}" if pid else "Unknown"
-
-    return {
-        "name": name,
-        "pid": pid,
+    info = {
+        "name": session.name,
+        "pid": session.pid,
         "volume": round(level, 3),
         "muted": bool(muted),
     }
+    return {"session": session, "info": info}
 
 
-def is_available():
-    """Return True if per-app volume control is available (Windows + pycaw)."""
-    return _pycaw_available
+def _add_entry(model, entry):
+    model["sessions"][entry["session"].key] = entry
+    # Sessions without a process (system sounds) are found by the name "system"
+    model["by_name"].setdefault(entry["info"]["name"].lower(), []).append(entry)
+    if entry["info"]["pid"]:
+        model["by_pid"][entry["info"]["pid"]] = entry
 
 
-def _get_master_endpoint():
-    """Get the default playback device's endpoint volume (for master volume). Returns None on failure."""
-    if not _pycaw_available:
-        return None
-    _ensure_com_initialized()
+def _remove_entry(model, key):
+    entry = model["sessions"].pop(key, None)
+    if entry is None:
+        return
+    name = entry["info"]["name"].lower()
+    same_name = [other for other in model["by_name"].get(name, []) if other is not entry]
+    if same_name:
+        model["by_name"][name] = same_name
+    else:
+        model["by_name"].pop(name, None)
+    if model["by_pid"].get(entry["info"]["pid"]) is entry:
+        del model["by_pid"][entry["info"]["pid"]]
+
+
+def _build_model(live):
+    """Enumerate all sessions once and index them by key, lowercased process name and PID."""
+    started = time.perf_counter()
     try:
-        device = AudioUtilities.GetSpeakers()
-        return device.EndpointVolume
-    except Exception as e:
-        logger.exception("_get_master_endpoint failed: %s", e)
-        return None
+        model = {"built": time.monotonic(), "live": live, "sessions": {}, "by_name": {}, "by_pid": {}}
+        for session in _backend.list_sessions():
+            _add_entry(model, _make_entry(session))
+        return model
+    finally:
+        metrics.observe_stage('session_enumeration', time.perf_counter() - started)
+
+
+def _ensure_notifications():
+    """Subscribe to backend notifications on first use. Returns True if they are running."""
+    global _notifications
+    with _model_lock:
+        if _notifications is None:
+            backend = _backend
+            _notifications = backend.start_notifications(
+                lambda event, payload: _on_backend_event(backend, event, payload))
+            if _notifications:
+                logger.info("Tracking audio sessions through %s notifications", backend.name)
+        return _notifications
+
+
+def _get_model(refresh=False):
+    """
+    Return the session model. With backend notifications it is built once and
+    then kept current by events; otherwise it is rebuilt when older than
+    SESSION_INDEX_TTL. refresh=True always rebuilds.
+    """
+    global _model
+    with _model_lock:
+        # Subscribe before enumerating so no session created in between is missed
+        _ensure_notifications()
+        if (refresh or _model is None
+                or (not _model["live"] and time.monotonic() - _model["built"] > SESSION_INDEX_TTL)):
+            _model = _build_model(_notifications)
+        return _model
+
+
+def _invalidate_model():
+    """Drop the session model so the next lookup enumerates sessions again."""
+    global _model
+    with _model_lock:
+        _model = None
+
+
+def _lookup(model, identifier):
+    """Entries in model matching identifier (PID, or process name with or without .exe)."""
+    if isinstance(identifier, int):
+        entry = model["by_pid"].get(identifier)
+        return [entry] if entry is not None else []
+    want_name = str(identifier).strip().lower()
+    if not want_name:
+        return []
+    return model["by_name"].get(want_name, []) + model["by_name"].get(want_name + ".exe", [])
 
 
 def get_master_volume():
@@ -81,36 +362,65 @@ def get_master_volume():
     Get system master volume and mute state.
     Returns {"volume": 0.0-1.0, "muted": bool} or None if unavailable.
     """
-    ep = _get_master_endpoint()
-    if ep is None:
+    global _master
+    if not is_available():
         return None
     try:
-        return {
-            "volume": round(ep.GetMasterVolumeLevelScalar(), 3),
-            "muted": bool(ep.GetMute()),
-        }
+        with _model_lock:
+            if _ensure_notifications() and _master is not None:
+                return dict(_master)
+        level, muted = _backend.get_master()
+        info = {"volume": round(level, 3), "muted": bool(muted)}
+        with _model_lock:
+            if _notifications:
+                _master = info
+        return dict(info)
     except Exception as e:
-        logger.exception("get_master_volume failed: %s", e)
+        _log_failure("get_master_volume", e)
         return None
 
 
+def _set_master_state(level=None, muted=None):
+    """Record a master change we made in the cache (notifications confirm it later)."""
+    with _model_lock:
+        if _master is not None:
+            if level is not None:
+                _master["volume"] = round(level, 3)
+            if muted is not None:
+                _master["muted"] = bool(muted)
+    _changed()
+
+
 def set_master_volume(volume):
     """
     Set system master volume. volume in [0.0, 1.0].
     Returns (success, message).
     """
-    ep = _get_master_endpoint()
-    if ep is None:
+    if not is_available():
         return False, "Master volume not available"
     try:
         level = max(0.0, min(1.0, float(volume)))
-        ep.SetMasterVolumeLevelScalar(level, None)
+        _cancel_fade(("master",))
+        _backend.set_master_volume(level)
+        _set_master_state(level=level)
         return True, f"Master volume set to {int(level * 100)}%"
     except Exception as e:
-        logger.exception("set_master_volume failed: %s", e)
+        _log_failure("set_master_volume", e)
         return False, str(e)
 
 
+def _adjust_master_volume(delta):
+    """Add delta to the master volume. Returns the new level."""
+    _cancel_fade(("master",))
+    with _model_lock:
+        cached = dict(_master) if _notifications and _master is not None else None
+    current = cached["volume"] if cached is not None else _backend.get_master()[0]
+    new_level = max(0.0, min(1.0, current + delta))
+    _backend.set_master_volume(new_level)
+    _set_master_state(level=new_level)
+    return new_level
+
+
 def master_volume_up(amount=None):
     """
     Increase system master volume by amount (default DEFAULT_VOLUME_STEP).
@@ -119,16 +429,13 @@ def master_volume_up(amount=None):
     if amount is None:
         amount = DEFAULT_VOLUME_STEP
     amount = max(0.0, min(1.0, float(amount)))
-    ep = _get_master_endpoint()
-    if ep is None:
+    if not is_available():
         return False, "Master volume not available"
     try:
-        current = ep.GetMasterVolumeLevelScalar()
-        new_level = min(1.0, current + amount)
-        ep.SetMasterVolumeLevelScalar(new_level, None)
+        new_level = _coalesced(("master",), amount, _adjust_master_volume)
         return True, f"Master volume up to {int(new_level * 100)}%"
     except Exception as e:
-        logger.exception("master_volume_up failed: %s", e)
+        _log_failure("master_volume_up", e)
         return False, str(e)
 
 
@@ -140,16 +447,13 @@ def master_volume_down(amount=None):
     if amount is None:
         amount = DEFAULT_VOLUME_STEP
     amount = max(0.0, min(1.0, float(amount)))
-    ep = _get_master_endpoint()
-    if ep is None:
+    if not is_available():
         return False, "Master volume not available"
     try:
-        current = ep.GetMasterVolumeLevelScalar()
-        new_level = max(0.0, current - amount)
-        ep.SetMasterVolumeLevelScalar(new_level, None)
+        new_level = _coalesced(("master",), -amount, _adjust_master_volume)
         return True, f"Master volume down to {int(new_level * 100)}%"
     except Exception as e:
-        logger.exception("master_volume_down failed: %s", e)
+        _log_failure("master_volume_down", e)
         return False, str(e)
 
 
@@ -158,14 +462,14 @@ def set_master_mute(muted):
     Mute or unmute system master. muted: True = mute, False = unmute.
     Returns (success, message).
     """
-    ep = _get_master_endpoint()
-    if ep is None:
+    if not is_available():
         return False, "Master volume not available"
     try:
-        ep.SetMute(1 if muted else 0, None)
+        _backend.set_master_mute(muted)
+        _set_master_state(muted=muted)
         return True, "Master muted" if muted else "Master unmuted"
     except Exception as e:
-        logger.exception("set_master_mute failed: %s", e)
+        _log_failure("set_master_mute", e)
         return False, str(e)
 
 
@@ -194,70 +498,127 @@ def toggle_master_mute():
 
 def get_audio_sessions():
     """Return list of dicts: name, pid, volume, muted for each audio session."""
-    if not _pycaw_available:
+    if not is_available():
         return []
-    _ensure_com_initialized()
     try:
-        sessions = AudioUtilities.GetAllSessions()
-        return [_session_to_info(s) for s in sessions]
+        with _model_lock:
+            return [dict(entry["info"]) for entry in _get_model()["sessions"].values()]
     except Exception as e:
-        logger.exception("GetAllSessions failed: %s", e)
+        _log_failure("GetAllSessions", e)
+        _invalidate_model()
         return []
 
 
-def _find_session(identifier):
+def read_audio_sessions():
+    """Like get_audio_sessions(), but raises if the backend fails instead of returning []."""
+    try:
+        with _model_lock:
+            return [dict(entry["info"]) for entry in _get_model()["sessions"].values()]
+    except Exception as e:
+        _log_failure("GetAllSessions", e)
+        _invalidate_model()
+        raise
+
+
+def get_peaks():
     """
-    Find a session by name (case-insensitive, matches exe name) or by PID.
-    identifier: str (process name like "chrome.exe") or int (PID).
-    Returns (session, volume_interface) or (None, None).
+    Peak meter levels (0.0-1.0) of every session and the master, read in one backend call.
+    Returns ([{"name", "pid", "peak"}], master peak or None). Raises if the backend fails.
     """
-    matches = _find_all_sessions(identifier)
-    if not matches:
-        return None, None
-    return matches[0]
+    with _model_lock:
+        entries = list(_get_model()["sessions"].values())
+    try:
+        peaks, master = _backend.read_peaks([entry["session"] for entry in entries])
+    except Exception:
+        _invalidate_model()
+        raise
+    apps = [{"name": entry["info"]["name"], "pid": entry["info"]["pid"], "peak": peaks[entry["session"].key]}
+            for entry in entries if entry["session"].key in peaks]
+    return apps, master
+
+
+def _group_sessions(sessions):
+    """Group session dicts by lowercased process name in one pass: {name key: group dict}."""
+    groups = {}
+    for info in sessions:
+        key = info["name"].lower()
+        group = groups.get(key)
+        if group is None:
+            groups[key] = {"name": info["name"], "processes": 1, "pids": [info["pid"]],
+                           "min_volume": info["volume"], "max_volume": info["volume"], "any_muted": info["muted"]}
+        else:
+            group["processes"] += 1
+            group["pids"].append(info["pid"])
+            group["min_volume"] = min(group["min_volume"], info["volume"])
+            group["max_volume"] = max(group["max_volume"], info["volume"])
+            group["any_muted"] = group["any_muted"] or info["muted"]
+    return groups
+
+
+def _sync_groups(current):
+    """Compare current groups with the last seen ones and bump the version if anything changed (call with _groups_lock held)."""
+    global _groups_version, _groups_floor
+    changed = [key for key, group in current.items() if key not in _groups or _groups[key]["group"] != group]
+    removed = [key for key in _groups if key not in current]
+    if not changed and not removed:
+        return
+    _groups_version += 1
+    for key in changed:
+        _groups[key] = {"group": current[key], "version": _groups_version}
+        _removed_groups.pop(key, None)
+    for key in removed:
+        _removed_groups[key] = {"name": _groups.pop(key)["group"]["name"], "version": _groups_version}
+        _removed_groups.move_to_end(key)
+    while len(_removed_groups) > MAX_REMOVED_GROUPS:
+        _key, dropped = _removed_groups.popitem(last=False)
+        _groups_floor = max(_groups_floor, dropped["version"])
+
+
+def get_app_groups(since=None):
+    """
+    Versioned app list. The version changes only when the per-name view changes.
+    Without since (or when since is unknown or too old): {"version", "apps": [sessions],
+    "groups": [{"name", "processes", "pids", "min_volume", "max_volume", "any_muted"}]}.
+    With a usable since: {"version", "since", "changed": [groups], "removed": [names]}.
+    Raises if the backend fails, so a failed read is never recorded as every app going away.
+    """
+    sessions = read_audio_sessions()
+    current = _group_sessions(sessions)
+    with _groups_lock:
+        _sync_groups(current)
+        if since is None or since < _groups_floor or since > _groups_version:
+            return {"version": _groups_version, "apps": sessions,
+                    "groups": sorted(current.values(), key=lambda group: group["name"].lower())}
+        return {
+            "version": _groups_version,
+            "since": since,
+            "changed": [item["group"] for item in _groups.values() if item["version"] > since],
+            "removed": [item["name"] for item in _removed_groups.values() if item["version"] > since],
+        }
 
 
-def _find_all_sessions(identifier):
+def _find_entries(identifier):
     """
-    Find all sessions matching identifier.
-    - By name (str): returns all sessions for that process name (e.g. all firefox.exe).
-    - By PID (int): returns at most one session.
-    Returns list of (session, SimpleAudioVolume); empty if none found.
+    Find all model entries matching identifier.
+    - By name (str): all sessions for that process name (e.g. all firefox.exe).
+    - By PID (int): at most one session.
+    Without notifications, a miss rebuilds the model once in case the app
+    started since it was built.
+    Returns a list of entries ({"session", "info"}); empty if none found.
     """
-    if not _pycaw_available:
+    if not is_available():
         return []
-    _ensure_com_initialized()
     try:
-        sessions = AudioUtilities.GetAllSessions()
-        want_pid = None
-        want_name = None
-        if isinstance(identifier, int):
-            want_pid = identifier
-        else:
-            want_name = str(identifier).strip().lower()
-            if not want_name:
-                return []
-
-        result = []
-        for session in sessions:
-            if want_pid is not None:
-                if getattr(session, "ProcessId", None) == want_pid:
-                    result.append((session, session.SimpleAudioVolume))
-                    break  # PID is unique, one match
-                continue
-            if session.Process is None:
-                if want_name == "system":
-                    result.append((session, session.SimpleAudioVolume))
-                continue
-            try:
-                name = session.Process.name().lower()
-                if name == want_name or name == want_name + ".exe":
-                    result.append((session, session.SimpleAudioVolume))
-            except Exception:
-                pass
-        return result
+        requested = time.monotonic()
+        with _model_lock:
+            model = _get_model()
+            matches = _lookup(model, identifier)
+            if not matches and not model["live"] and model["built"] < requested:
+                matches = _lookup(_get_model(refresh=True), identifier)
+        return matches
     except Exception as e:
-        logger.exception("_find_all_sessions failed: %s", e)
+        _log_failure("_find_entries", e)
+        _invalidate_model()
         return []
 
 
@@ -268,38 +629,70 @@ def set_volume(identifier, volume):
     When using app name, applies to all windows/processes with that name.
     Returns (success, message).
     """
-    matches = _find_all_sessions(identifier)
+    matches = _find_entries(identifier)
     if not matches:
         return False, f"App not found: {identifier}"
     try:
         level = max(0.0, min(1.0, float(volume)))
-        for _session, vol in matches:
-            vol.SetMasterVolume(level, None)
+        _cancel_fade(_volume_target(identifier))
+        for entry in matches:
+            entry["session"].set_volume(level)
+            _record(entry, volume=level)
         count = len(matches)
         return True, f"Volume set to {int(level * 100)}%" + (f" ({count} process(es))" if count > 1 else "")
     except Exception as e:
-        logger.exception("set_volume failed: %s", e)
+        _log_failure("set_volume", e)
+        _invalidate_model()
         return False, str(e)
 
 
 def get_volume(identifier):
     """
     Get current volume and mute for an app.
+    Served from the session model when notifications keep it current.
     Returns dict with volume, muted, or None if not found.
     """
-    session, vol = _find_session(identifier)
-    if vol is None:
+    matches = _find_entries(identifier)
+    if not matches:
         return None
+    entry = matches[0]
+    if _notifications:
+        return {"volume": entry["info"]["volume"], "muted": entry["info"]["muted"]}
     try:
-        return {
-            "volume": round(vol.GetMasterVolume(), 3),
-            "muted": bool(vol.GetMute()),
-        }
+        level = round(entry["session"].get_volume(), 3)
+        muted = bool(entry["session"].get_mute())
+        _record(entry, volume=level, muted=muted)
+        return {"volume": level, "muted": muted}
     except Exception as e:
-        logger.exception("get_volume failed: %s", e)
+        _log_failure("get_volume", e)
+        _invalidate_model()
         return None
 
 
+def _volume_target(identifier):
+    """Coalescing key for an app identifier."""
+    if isinstance(identifier, int):
+        return ("pid", identifier)
+    return ("app", str(identifier).strip().lower())
+
+
+def _adjust_volume(identifier, delta):
+    """
+    Add delta to the volume of every matching session.
+    Returns (success, matched_count, new level of the first match).
+    """
+    matches = _find_entries(identifier)
+    if not matches:
+        return False, 0, None
+    _cancel_fade(_volume_target(identifier))
+    for entry in matches:
+        current = entry["info"]["volume"] if _notifications else entry["session"].get_volume()
+        level = max(0.0, min(1.0, current + delta))
+        entry["session"].set_volume(level)
+        _record(entry, volume=level)
+    return True, len(matches), matches[0]["info"]["volume"]
+
+
 def volume_up(identifier, amount=None):
     """
     Increase volume by amount (default DEFAULT_VOLUME_STEP).
@@ -309,17 +702,15 @@ def volume_up(identifier, amount=None):
     if amount is None:
         amount = DEFAULT_VOLUME_STEP
     amount = max(0.0, min(1.0, float(amount)))
-    matches = _find_all_sessions(identifier)
-    if not matches:
-        return False, f"App not found: {identifier}"
     try:
-        for _session, vol in matches:
-            current = vol.GetMasterVolume()
-            vol.SetMasterVolume(min(1.0, current + amount), None)
-        count = len(matches)
-        return True, f"Volume up" + (f" ({count} process(es))" if count > 1 else "")
+        found, count, level = _coalesced(_volume_target(identifier), amount,
+                                         lambda delta: _adjust_volume(identifier, delta))
+        if not found:
+            return False, f"App not found: {identifier}"
+        return True, f"Volume up to {int(level * 100)}%" + (f" ({count} process(es))" if count > 1 else "")
     except Exception as e:
-        logger.exception("volume_up failed: %s", e)
+        _log_failure("volume_up", e)
+        _invalidate_model()
         return False, str(e)
 
 
@@ -332,17 +723,15 @@ def volume_down(identifier, amount=None):
     if amount is None:
         amount = DEFAULT_VOLUME_STEP
     amount = max(0.0, min(1.0, float(amount)))
-    matches = _find_all_sessions(identifier)
-    if not matches:
-        return False, f"App not found: {identifier}"
     try:
-        for _session, vol in matches:
-            current = vol.GetMasterVolume()
-            vol.SetMasterVolume(max(0.0, current - amount), None)
-        count = len(matches)
-        return True, f"Volume down" + (f" ({count} process(es))" if count > 1 else "")
+        found, count, level = _coalesced(_volume_target(identifier), -amount,
+                                         lambda delta: _adjust_volume(identifier, delta))
+        if not found:
+            return False, f"App not found: {identifier}"
+        return True, f"Volume down to {int(level * 100)}%" + (f" ({count} process(es))" if count > 1 else "")
     except Exception as e:
-        logger.exception("volume_down failed: %s", e)
+        _log_failure("volume_down", e)
+        _invalidate_model()
         return False, str(e)
 
 
@@ -352,17 +741,19 @@ def set_mute(identifier, muted):
     muted: True = mute, False = unmute.
     Returns (success, message).
     """
-    matches = _find_all_sessions(identifier)
+    matches = _find_entries(identifier)
     if not matches:
         return False, f"App not found: {identifier}"
     try:
-        for _session, vol in matches:
-            vol.SetMute(1 if muted else 0, None)
+        for entry in matches:
+            entry["session"].set_mute(muted)
+            _record(entry, muted=muted)
         count = len(matches)
         msg = "Muted" if muted else "Unmuted"
         return True, msg + (f" ({count} process(es))" if count > 1 else "")
     except Exception as e:
-        logger.exception("set_mute failed: %s", e)
+        _log_failure("set_mute", e)
+        _invalidate_model()
         return False, str(e)
 
 
@@ -387,3 +778,413 @@ def toggle_mute(identifier):
     new_muted = not info["muted"]
     ok, msg = set_mute(identifier, new_muted)
     return ok, msg, new_muted if ok else None
+
+
+def _select(model, op):
+    """Entries a bulk operation targets ("app", "pid" or "all_except")."""
+    if "pid" in op:
+        return _lookup(model, int(op["pid"]))
+    if "app" in op:
+        return _lookup(model, op["app"])
+    excluded_names = set()
+    excluded_pids = set()
+    for item in op["all_except"]:
+        if isinstance(item, int):
+            excluded_pids.add(item)
+        else:
+            name = item.strip().lower()
+            excluded_names.update((name, name + ".exe"))
+    return [entry for entry in model["sessions"].values()
+            if entry["info"]["pid"] not in excluded_pids and entry["info"]["name"].lower() not in excluded_names]
+
+
+def _fade_entries(op, entries, target):
+    """Start the fade of a bulk "set" with "duration_ms": one fade for an app/PID, one per session for all_except."""
+    end = max(0.0, min(1.0, float(op["volume"])))
+    duration = max(0.0, min(MAX_FADE_DURATION, float(op["duration_ms"]) / 1000.0))
+    curve = op.get("curve", "linear")
+    if target is not None:
+        groups = [(target, str(op.get("app", op.get("pid"))), entries)]
+    else:
+        groups = [(("pid", entry["info"]["pid"]), entry["info"]["name"], [entry]) for entry in entries]
+    for fade_target, label, group in groups:
+        steps = [(_session_setter(entry), entry["info"]["volume"] if _notifications else entry["session"].get_volume())
+                 for entry in group]
+        _start_fade(fade_target, label, steps, end, duration, curve)
+
+
+def _apply_session_op(op, entries, target=None):
+    """
+    Apply one bulk operation to the selected entries. Returns a result dict.
+    target: fade key of an app/PID selector (None for all_except).
+    """
+    kind = op["op"]
+    if kind == "set" and "duration_ms" in op:
+        _fade_entries(op, entries, target)
+        return {"success": True, "fading": True, "sessions": [dict(entry["info"]) for entry in entries]}
+    if kind == "toggle":
+        # Unmute only if every selected session is muted (same as toggle_mute for a single session)
+        if _notifications:
+            all_muted = all(entry["info"]["muted"] for entry in entries)
+        else:
+            all_muted = all(entry["session"].get_mute() for entry in entries)
+        kind = "unmute" if all_muted else "mute"
+    for entry in entries:
+        if kind in ("mute", "unmute"):
+            entry["session"].set_mute(kind == "mute")
+            _record(entry, muted=kind == "mute")
+            continue
+        if kind == "set":
+            level = float(op["volume"])
+        else:
+            current = entry["info"]["volume"] if _notifications else entry["session"].get_volume()
+            level = current + float(op["amount"])
+        level = max(0.0, min(1.0, level))
+        entry["session"].set_volume(level)
+        _record(entry, volume=level)
+    return {"success": True, "sessions": [dict(entry["info"]) for entry in entries]}
+
+
+def _apply_master_op(op):
+    """Apply one bulk operation to the master volume. Returns a result dict."""
+    kind = op["op"]
+    if kind == "set" and "duration_ms" in op:
+        info = get_master_volume()
+        if info is None:
+            return {"success": False, "error": "Master volume not available"}
+        end = max(0.0, min(1.0, float(op["volume"])))
+        duration = max(0.0, min(MAX_FADE_DURATION, float(op["duration_ms"]) / 1000.0))
+        _start_fade(("master",), "master", [(_master_setter, info["volume"])], end, duration, op.get("curve", "linear"))
+        return dict(info, success=True, fading=True)
+    if kind == "set":
+        level = max(0.0, min(1.0, float(op["volume"])))
+        _cancel_fade(("master",))
+        _backend.set_master_volume(level)
+        _set_master_state(level=level)
+    elif kind == "delta":
+        _adjust_master_volume(float(op["amount"]))
+    else:
+        if kind == "toggle":
+            info = get_master_volume()
+            if info is None:
+                return {"success": False, "error": "Master volume not available"}
+            kind = "unmute" if info["muted"] else "mute"
+        _backend.set_master_mute(kind == "mute")
+        _set_master_state(muted=kind == "mute")
+    info = get_master_volume()
+    if info is None:
+        return {"success": False, "error": "Master volume not available"}
+    return dict(info, success=True)
+
+
+def apply_bulk(operations):
+    """
+    Apply many volume operations, all resolved against one session snapshot.
+    operations: dicts checked by actions.validate_bulk_op(): "op" is set (with
+    "volume"), delta (with signed "amount"), mute, unmute or toggle; the target
+    is "app", "pid", "master": true, or "all_except": [names and/or PIDs].
+    A "set" with "duration_ms" (and optional "curve") starts a fade instead.
+    Returns one result dict per operation, in order: the target fields plus
+    "success" and either the resulting states or "error" ("missing": true when
+    no session matched).
+    """
+    with _model_lock:
+        model = _get_model()
+        selected = [None if "master" in op else _select(model, op) for op in operations]
+    results = []
+    for op, entries in zip(operations, selected):
+        target = {field: op[field] for field in ("app", "pid", "master", "all_except") if field in op}
+        try:
+            if entries is None:
+                result = _apply_master_op(op)
+            elif not entries and "all_except" not in op:
+                result = {"success": False, "missing": True, "error": f"App not found: {op.get('app', op.get('pid'))}"}
+            else:
+                fade_target = None
+                if "all_except" not in op:
+                    fade_target = _volume_target(int(op["pid"]) if "pid" in op else op["app"])
+                    if op["op"] in ("set", "delta") and "duration_ms" not in op:
+                        _cancel_fade(fade_target)
+                result = _apply_session_op(op, entries, fade_target)
+        except Exception as e:
+            _log_failure("Bulk volume operation", e)
+            _invalidate_model()
+            result = {"success": False, "error": str(e)}
+        results.append(dict(target, op=op["op"], **result))
+    return results
+
+
+def _fade_level(start, end, progress, curve):
+    """Level at progress (0.0-1.0) of a fade from start to end."""
+    if progress >= 1.0:
+        return end
+    if curve == "linear":
+        return start + (end - start) * progress
+    floor = 10 ** (FADE_FLOOR_DB / 20)
+    start_db = 20 * math.log10(max(start, floor))
+    end_db = 20 * math.log10(max(end, floor))
+    level = 10 ** ((start_db + (end_db - start_db) * progress) / 20)
+    return 0.0 if level <= floor else level
+
+
+def _cancel_fade(target):
+    """Stop the fade running on target, if any."""
+    with _fades_lock:
+        fade = _fades.pop(target, None)
+    if fade is not None:
+        fade["call"].cancel()
+
+
+def _start_fade(target, label, steps, end, duration, curve):
+    """
+    Start a fade on target, superseding any fade already running on it.
+    steps: list of (set_level(level), start_level) pairs, one per session (or the master).
+    """
+    fade = {"target": target, "label": label, "steps": steps, "end": end, "duration": duration,
+            "curve": curve, "started": time.monotonic(), "call": None, "last": [None] * len(steps)}
+    with _fades_lock:
+        previous = _fades.get(target)
+        if previous is not None:
+            previous["call"].cancel()
+        _fades[target] = fade
+        fade["call"] = _fade_timer.call_later(0, _fade_step, fade)
+
+
+def _fade_step(fade):
+    """Apply one ramp step of a fade and schedule the next (runs on the fade timer thread)."""
+    with _fades_lock:
+        if _fades.get(fade["target"]) is not fade:
+            return
+    elapsed = time.monotonic() - fade["started"]
+    progress = min(1.0, elapsed / fade["duration"]) if fade["duration"] > 0 else 1.0
+    try:
+        for index, (set_level, start) in enumerate(fade["steps"]):
+            level = round(_fade_level(start, fade["end"], progress, fade["curve"]), 3)
+            # Skip steps too small to change the stored level
+            if level != fade["last"][index]:
+                set_level(level)
+                fade["last"][index] = level
+    except Exception as e:
+        logger.warning(f"Fade on {fade['label']} stopped: {str(e)}")
+        _invalidate_model()
+        progress = 1.0
+    with _fades_lock:
+        if _fades.get(fade["target"]) is not fade:
+            return
+        if progress >= 1.0:
+            del _fades[fade["target"]]
+        else:
+            fade["call"] = _fade_timer.call_later(FADE_STEP_INTERVAL, _fade_step, fade)
+
+
+def _session_setter(entry):
+    def set_level(level):
+        entry["session"].set_volume(level)
+        _record(entry, volume=level)
+    return set_level
+
+
+def _master_setter(level):
+    _backend.set_master_volume(level)
+    _set_master_state(level=level)
+
+
+def fade(identifier, volume, duration, curve="linear"):
+    """
+    Fade an app (all processes when identified by name) to volume over duration seconds.
+    curve: "linear" or "log". Returns straight away; the ramp runs on the fade timer.
+    A new fade or an explicit volume change on the same app supersedes a running fade.
+    Returns (success, message).
+    """
+    matches = _find_entries(identifier)
+    if not matches:
+        return False, f"App not found: {identifier}"
+    try:
+        end = max(0.0, min(1.0, float(volume)))
+        duration = max(0.0, min(MAX_FADE_DURATION, float(duration)))
+        steps = []
+        for entry in matches:
+            start = entry["info"]["volume"] if _notifications else entry["session"].get_volume()
+            steps.append((_session_setter(entry), start))
+        _start_fade(_volume_target(identifier), str(identifier), steps, end, duration, curve)
+        count = len(matches)
+        return True, (f"Fading to {int(end * 100)}% over {int(duration * 1000)}ms"
+                      + (f" ({count} process(es))" if count > 1 else ""))
+    except Exception as e:
+        _log_failure("fade", e)
+        _invalidate_model()
+        return False, str(e)
+
+
+def fade_master(volume, duration, curve="linear"):
+    """
+    Fade system master volume to volume over duration seconds. See fade().
+    Returns (success, message).
+    """
+    info = get_master_volume()
+    if info is None:
+        return False, "Master volume not available"
+    end = max(0.0, min(1.0, float(volume)))
+    duration = max(0.0, min(MAX_FADE_DURATION, float(duration)))
+    _start_fade(("master",), "master", [(_master_setter, info["volume"])], end, duration, curve)
+    return True, f"Fading master to {int(end * 100)}% over {int(duration * 1000)}ms"
+
+
+def _build_devices(live):
+    """Enumerate active devices once and index them by id and lowercased name."""
+    with metrics.timed('device_enumeration'):
+        devices, defaults = _backend.list_devices()
+    index = {"built": time.monotonic(), "live": live, "devices": [], "by_id": {}, "by_name": {},
+             "defaults": dict(defaults)}
+    for device in devices:
+        device = {"id": device["id"], "name": device["name"], "flow": device["flow"]}
+        index["devices"].append(device)
+        index["by_id"][device["id"]] = device
+        index["by_name"].setdefault(device["name"].lower(), []).append(device)
+    return index
+
+
+def _get_devices(refresh=False):
+    """
+    Return the device index. With backend notifications it is kept until a
+    device change drops it; otherwise it is rebuilt when older than
+    DEVICE_INDEX_TTL. refresh=True always rebuilds.
+    """
+    global _devices
+    with _model_lock:
+        _ensure_notifications()
+        if (refresh or _devices is None
+                or (not _devices["live"] and time.monotonic() - _devices["built"] > DEVICE_INDEX_TTL)):
+            _devices = _build_devices(_notifications)
+        return _devices
+
+
+def _device_info(index, device):
+    return dict(device, default=index["defaults"].get(device["flow"]) == device["id"])
+
+
+def get_devices(flow=None):
+    """
+    List active audio devices from the device index: dicts with id, name, flow
+    ("render" or "capture") and default. flow limits the list to one direction.
+    Returns None if the devices can't be read.
+    """
+    if not is_available():
+        return None
+    try:
+        with _model_lock:
+            index = _get_devices()
+            return [_device_info(index, device) for device in index["devices"]
+                    if flow is None or device["flow"] == flow]
+    except Exception as e:
+        _log_failure("list_devices", e)
+        return None
+
+
+def _match_device(index, identifier):
+    """Devices matching identifier: its id, else its exact name, else names containing it (case-insensitive)."""
+    device = index["by_id"].get(identifier)
+    if device is not None:
+        return [device]
+    want = identifier.strip().lower()
+    if not want:
+        return []
+    if want in index["by_name"]:
+        return index["by_name"][want]
+    return [device for device in index["devices"] if want in device["name"].lower()]
+
+
+def _find_device(identifier):
+    """
+    Resolve a device id or name through the device index. Without notifications,
+    a miss rebuilds the index once in case the device was plugged in since.
+    Returns (device, None) or (None, error message). Raises if the backend fails.
+    """
+    identifier = str(identifier)
+    requested = time.monotonic()
+    with _model_lock:
+        index = _get_devices()
+        matches = _match_device(index, identifier)
+        if not matches and not index["live"] and index["built"] < requested:
+            index = _get_devices(refresh=True)
+            matches = _match_device(index, identifier)
+        if not matches:
+            return None, f"Device not found: {identifier}"
+        if len(matches) > 1:
+            names = ", ".join(device["name"] for device in matches)
+            return None, f"Device name is ambiguous: {identifier} (matches {names})"
+        return _device_info(index, matches[0]), None
+
+
+def set_default_device(identifier):
+    """
+    Make a device (id or name) the default for its direction, e.g. switch the output to headphones.
+    Returns (success, message); success is False if the device can't be resolved. Raises if the backend fails.
+    """
+    if not is_available():
+        return False, "Audio devices not available"
+    try:
+        device, error = _find_device(identifier)
+        if device is None:
+            return False, error
+        if not device["default"]:
+            _backend.set_default_device(device["id"])
+            with _model_lock:
+                # Notifications drop the index soon; until then it already shows the new default
+                if _devices is not None:
+                    _devices["defaults"][device["flow"]] = device["id"]
+        kind = "playback" if device["flow"] == "render" else "recording"
+        return True, f"Default {kind} device set to {device['name']}"
+    except Exception as e:
+        _log_failure("set_default_device", e)
+        raise
+
+
+def get_device_volume(identifier):
+    """
+    Get volume and mute of a device (id or name).
+    Returns (info, message): info is a device dict with volume and muted, or None if the device
+    can't be resolved. Raises if the backend fails.
+    """
+    if not is_available():
+        return None, "Audio devices not available"
+    try:
+        device, error = _find_device(identifier)
+        if device is None:
+            return None, error
+        level, muted = _backend.get_device_volume(device["id"])
+        return dict(device, volume=round(level, 3), muted=bool(muted)), "OK"
+    except Exception as e:
+        _log_failure("get_device_volume", e)
+        raise
+
+
+def set_device_volume(identifier, volume=None, muted=None):
+    """
+    Set the volume (0.0-1.0) and/or mute of a device (id or name).
+    Returns (success, message); success is False if the device can't be resolved. Raises if the backend fails.
+    """
+    if not is_available():
+        return False, "Audio devices not available"
+    try:
+        device, error = _find_device(identifier)
+        if device is None:
+            return False, error
+        is_master = device["default"] and device["flow"] == "render"
+        parts = []
+        if volume is not None:
+            level = max(0.0, min(1.0, float(volume)))
+            if is_master:
+                _cancel_fade(("master",))
+            _backend.set_device_volume(device["id"], level)
+            parts.append(f"volume set to {int(level * 100)}%")
+        if muted is not None:
+            _backend.set_device_mute(device["id"], bool(muted))
+            parts.append("muted" if muted else "unmuted")
+        if is_master:
+            # The default playback device is the master
+            _set_master_state(level=level if volume is not None else None, muted=muted)
+        return True, f"{device['name']}: " + (", ".join(parts) or "unchanged")
+    except Exception as e:
+        _log_failure("set_device_volume", e)
+        raise
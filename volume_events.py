@@ -0,0 +1,167 @@
+"""
+Push stream of volume and mute changes.
+
+A subscriber first gets a snapshot of every app session and the master, then
+"changed" messages carrying only what changed:
+
+    {"event": "snapshot", "apps": [{"name": "chrome.exe", "pid": 1234, "volume": 0.8, "muted": false}, ...],
+     "master": {"volume": 0.5, "muted": false}}
+    {"event": "changed", "apps": [...], "removed": [{"name": "chrome.exe", "pid": 1234}], "master": {...}}
+
+One publisher thread diffs the state volume_controller already knows against
+the last published state, woken by its change listener (or every
+POLL_INTERVAL when the backend can't notify). Each subscriber keeps only the
+latest pending state per session, so a slow client skips intermediate values
+instead of growing a queue.
+"""
+
+import logging
+import threading
+import time
+
+import volume_controller
+
+logger = logging.getLogger(__name__)
+
+# Shortest gap between two publishes; changes in between go out together (seconds)
+PUSH_INTERVAL = 0.05
+
+# How often state is re-read when the backend can't deliver notifications (seconds)
+POLL_INTERVAL = 1.0
+
+# Key of the master state in state dicts (sessions are keyed by (pid, name))
+MASTER = 'master'
+
+_subscribers = set()
+_last = {}
+_lock = threading.Lock()          # _subscribers and _last; held while reading and publishing state
+_wake = threading.Condition()     # guards _dirty
+_dirty = False
+_thread = None
+
+
+class Subscription:
+    """One subscriber's pending messages. Read with get(); call close() when done."""
+
+    def __init__(self, snapshot):
+        self._cond = threading.Condition()
+        self._snapshot = _snapshot_message(snapshot)
+        self._pending = {}
+        self.closed = False
+
+    def _offer(self, changes):
+        with self._cond:
+            self._pending.update(changes)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """
+        Wait for the next message: the snapshot first, then "changed" messages.
+        Returns None on timeout or once closed.
+        """
+        with self._cond:
+            if self._snapshot is not None:
+                message, self._snapshot = self._snapshot, None
+                return message
+            if not self._pending and not self.closed:
+                self._cond.wait(timeout)
+            if self.closed or not self._pending:
+                return None
+            pending, self._pending = self._pending, {}
+        return _changed_message(pending)
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+        with _lock:
+            _subscribers.discard(self)
+
+
+def _read_state():
+    """
+    Current state: {(pid, name): app dict, MASTER: master dict}. Raises if the
+    backend fails, so a failed read never looks like every app going away.
+    """
+    state = {(app['pid'], app['name']): app for app in volume_controller.read_audio_sessions()}
+    master = volume_controller.get_master_volume()
+    if master is None:
+        raise RuntimeError("Master volume could not be read")
+    state[MASTER] = master
+    return state
+
+
+def _snapshot_message(state):
+    message = {'event': 'snapshot', 'apps': [app for key, app in state.items() if key != MASTER]}
+    if MASTER in state:
+        message['master'] = state[MASTER]
+    return message
+
+
+def _changed_message(pending):
+    """pending: {key: new state, or None if the session is gone}."""
+    message = {'event': 'changed'}
+    apps = [app for key, app in pending.items() if key != MASTER and app is not None]
+    removed = [{'name': key[1], 'pid': key[0]} for key, app in pending.items() if key != MASTER and app is None]
+    if apps:
+        message['apps'] = apps
+    if removed:
+        message['removed'] = removed
+    if pending.get(MASTER) is not None:
+        message['master'] = pending[MASTER]
+    return message
+
+
+def _mark_dirty():
+    global _dirty
+    with _wake:
+        _dirty = True
+        _wake.notify()
+
+
+def _publish():
+    """Diff current state against the last published one and hand changes to subscribers (call with _lock held)."""
+    global _last
+    current = _read_state()
+    changes = {key: value for key, value in current.items() if _last.get(key) != value}
+    changes.update({key: None for key in _last if key not in current})
+    _last = current
+    if changes:
+        for subscription in _subscribers:
+            subscription._offer(changes)
+
+
+def _run():
+    global _dirty
+    while True:
+        with _wake:
+            if not _dirty:
+                _wake.wait(None if volume_controller.notifications_active() else POLL_INTERVAL)
+            _dirty = False
+        with _lock:
+            # While the backend's breaker is open there is no state to diff against
+            if _subscribers and volume_controller.retry_after() is None:
+                try:
+                    _publish()
+                except Exception as e:
+                    logger.error(f"Error publishing volume changes: {str(e)}")
+        time.sleep(PUSH_INTERVAL)
+
+
+def subscribe():
+    """Register a subscriber. Returns a Subscription whose first message is the snapshot."""
+    global _thread, _last
+    with _lock:
+        snapshot = _read_state()
+        if not _subscribers:
+            # Nothing was published while nobody listened; start diffing from here
+            _last = snapshot
+        subscription = Subscription(snapshot)
+        _subscribers.add(subscription)
+        if _thread is None:
+            _thread = threading.Thread(target=_run, daemon=True, name='volume-events')
+            _thread.start()
+    return subscription
+
+
+volume_controller.add_change_listener(_mark_dirty)
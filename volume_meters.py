@@ -0,0 +1,181 @@
+"""
+Peak-meter stream for all audio sessions and the master.
+
+While anyone is subscribed, one sampler thread reads the peak of every
+session and of the master in a single backend call, METER_RATE times a second
+(see set_rate()). Peaks are quantized to 0-METER_LEVELS and each subscriber
+only gets the values that changed since its previous message:
+
+    {"event": "snapshot", "peaks": {"1234": 37, "0": 2}, "names": {"1234": "chrome.exe", "0": "System"},
+     "master": 41}
+    {"event": "meters", "peaks": {"1234": 12}, "removed": ["5678"], "master": 9}
+
+Sessions are keyed by PID (as a string); "names" carries the process name the
+first time a subscriber sees a PID. Sampling cost grows with the number of
+sessions, not subscribers, and the thread stops when the last one leaves.
+"""
+
+import logging
+import threading
+import time
+
+import metrics
+import volume_controller
+
+logger = logging.getLogger(__name__)
+
+# Default and highest sampling rate (samples per second)
+METER_RATE = 20
+MAX_METER_RATE = 60
+
+# Peaks are sent as integers 0..METER_LEVELS
+METER_LEVELS = 100
+
+# Key of the master level in frames (sessions are keyed by PID string)
+MASTER = 'master'
+
+_rate = METER_RATE
+_subscribers = set()
+_lock = threading.Lock()    # _subscribers and _thread
+_thread = None
+
+
+class Subscription:
+    """One subscriber's pending meter values. Read with get(); call close() when done."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._named = set()
+        self._event = 'snapshot'
+        self._ready = False
+        self.closed = False
+
+    def _offer(self, frame, changes):
+        with self._cond:
+            if self._event == 'snapshot' and not self._ready:
+                self._pending = dict(frame)
+                self._ready = True
+            elif changes:
+                self._pending.update(changes)
+                self._ready = True
+            if self._ready:
+                self._cond.notify()
+
+    def get(self, timeout=None):
+        """
+        Wait for the next message: a "snapshot" with every level, then "meters" messages
+        with the levels that changed. Returns None on timeout or once closed.
+        """
+        with self._cond:
+            if not self._ready and not self.closed:
+                self._cond.wait(timeout)
+            if self.closed or not self._ready:
+                return None
+            pending, self._pending = self._pending, {}
+            event, self._event = self._event, 'meters'
+            self._ready = False
+            return self._message(event, pending)
+
+    def _message(self, event, pending):
+        message = {'event': event, 'peaks': {}}
+        names = {}
+        removed = []
+        for key, value in pending.items():
+            if key == MASTER:
+                if value is not None:
+                    message['master'] = value
+            elif value is None:
+                if key in self._named:
+                    self._named.discard(key)
+                    removed.append(key)
+            else:
+                name, level = value
+                message['peaks'][key] = level
+                if key not in self._named:
+                    self._named.add(key)
+                    names[key] = name
+        if names:
+            message['names'] = names
+        if removed:
+            message['removed'] = removed
+        return message
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+        with _lock:
+            _subscribers.discard(self)
+
+
+def set_rate(rate):
+    """Sample rate in samples per second (clamped to 1..MAX_METER_RATE)."""
+    global _rate
+    _rate = max(1, min(MAX_METER_RATE, rate))
+
+
+def _quantize(peak):
+    return int(round(max(0.0, min(1.0, peak)) * METER_LEVELS))
+
+
+def _sample():
+    """One frame: {PID string: (name, level), MASTER: level}. Several sessions of one PID keep the highest."""
+    with metrics.timed('meter_sample'):
+        apps, master = volume_controller.get_peaks()
+    frame = {}
+    for app in apps:
+        key = str(app['pid'])
+        level = _quantize(app['peak'])
+        if key not in frame or frame[key][1] < level:
+            frame[key] = (app['name'], level)
+    if master is not None:
+        frame[MASTER] = _quantize(master)
+    return frame
+
+
+def _run():
+    global _thread
+    last = {}
+    failing = False
+    while True:
+        started = time.monotonic()
+        with _lock:
+            if not _subscribers:
+                _thread = None
+                return
+            subscribers = list(_subscribers)
+        try:
+            # Hold the last levels while the backend's breaker is open
+            frame = last if volume_controller.retry_after() is not None else _sample()
+            failing = False
+        except Exception as e:
+            # Log once per failure streak, not on every sample
+            if not failing:
+                logger.error(f"Error sampling audio peaks: {str(e)}")
+            failing = True
+            frame = last
+        changes = {key: value for key, value in frame.items() if last.get(key) != value}
+        changes.update({key: None for key in last if key not in frame})
+        last = frame
+        for subscription in subscribers:
+            subscription._offer(frame, changes)
+        time.sleep(max(0.0, 1.0 / _rate - (time.monotonic() - started)))
+
+
+def subscribe():
+    """Register a subscriber (starting the sampler if needed). Returns a Subscription."""
+    global _thread
+    subscription = Subscription()
+    with _lock:
+        _subscribers.add(subscription)
+        if _thread is None:
+            _thread = threading.Thread(target=_run, daemon=True, name='volume-meters')
+            _thread.start()
+    return subscription
+
+
+def sampling():
+    """True while the sampler thread is running."""
+    with _lock:
+        return _thread is not None
@@ -0,0 +1,190 @@
+"""
+Named volume scenes: saved app and master levels, restored in one pass.
+
+A scene records the volume and mute state of every app, by process name
+since PIDs don't survive restarts, and of the master:
+
+    {"name": "gaming", "saved": 1760000000.0,
+     "apps": [{"name": "discord.exe", "volume": 0.6, "muted": false}, ...],
+     "master": {"volume": 0.5, "muted": false}}
+
+All scenes live in one JSON file, read on first use and rewritten on each
+save or delete. A file that can't be read is moved aside to "<file>.bad"
+rather than overwritten. restore() turns a scene into volume_controller.apply_bulk()
+operations, so every app is matched against one session snapshot and set in
+one pass (or faded on the fade timer).
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+import volume_controller
+
+logger = logging.getLogger(__name__)
+
+# Where scenes are stored unless set_scenes_file() says otherwise
+SCENES_FILE = os.path.join(os.path.expanduser('~'), '.keyfree_companion', 'scenes.json')
+
+# Longest scene name accepted
+MAX_SCENE_NAME = 64
+
+_path = SCENES_FILE
+_scenes = None            # name -> scene dict, loaded on first use
+_read_only = False        # the file couldn't be read or moved aside; never overwrite it
+_lock = threading.Lock()
+
+
+def set_scenes_file(path):
+    """Store scenes in path from now on (they are re-read on next use)."""
+    global _path, _scenes, _read_only
+    with _lock:
+        _path = path
+        _scenes = None
+        _read_only = False
+
+
+def valid_name(name):
+    """True if name can be used as a scene name."""
+    return isinstance(name, str) and 0 < len(name.strip()) <= MAX_SCENE_NAME
+
+
+def _load():
+    """Scenes from disk, read once (call with _lock held)."""
+    global _scenes, _read_only
+    if _scenes is None:
+        try:
+            with open(_path, encoding='utf-8') as f:
+                data = json.load(f)
+            scenes = data['scenes']
+            if not all(isinstance(scene, dict) and valid_name(scene.get('name'))
+                       and isinstance(scene.get('apps'), list) for scene in scenes):
+                raise ValueError("a scene has no valid name or apps")
+            _scenes = {scene['name']: scene for scene in scenes}
+        except FileNotFoundError:
+            _scenes = {}
+        except Exception as e:
+            _scenes = {}
+            bad_path = _path + '.bad'
+            if os.path.exists(bad_path):
+                # Keep an earlier unreadable file too
+                bad_path += f'.{int(time.time())}'
+            try:
+                os.replace(_path, bad_path)
+                logger.error(f"Error reading scenes from {_path} ({str(e)}); moved it to {bad_path}")
+            except OSError as move_error:
+                _read_only = True
+                logger.error(f"Error reading scenes from {_path} ({str(e)}) and could not move it aside "
+                             f"({str(move_error)}); scenes will not be saved")
+    return _scenes
+
+
+def _write():
+    """Write all scenes to disk through a temporary file (call with _lock held)."""
+    if _read_only:
+        raise RuntimeError(f"Scenes file {_path} could not be read; not overwriting it")
+    directory = os.path.dirname(_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = _path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'scenes': sorted(_scenes.values(), key=lambda scene: scene['name'])}, f, indent=2)
+    os.replace(temp_path, _path)
+
+
+def _capture():
+    """
+    Current app levels per process name: the loudest process's volume, muted only if every process is.
+    Raises if the backend fails.
+    """
+    apps = {}
+    for info in volume_controller.read_audio_sessions():
+        key = info['name'].lower()
+        app = apps.get(key)
+        if app is None:
+            apps[key] = {'name': info['name'], 'volume': info['volume'], 'muted': info['muted']}
+        else:
+            app['volume'] = max(app['volume'], info['volume'])
+            app['muted'] = app['muted'] and info['muted']
+    return sorted(apps.values(), key=lambda app: app['name'].lower())
+
+
+def list_scenes():
+    """Summaries of all scenes: [{"name", "saved", "apps": count}]."""
+    with _lock:
+        return [{'name': scene['name'], 'saved': scene.get('saved'), 'apps': len(scene['apps'])}
+                for scene in sorted(_load().values(), key=lambda scene: scene['name'])]
+
+
+def get_scene(name):
+    """The scene called name, or None."""
+    with _lock:
+        return _load().get(name.strip())
+
+
+def save_scene(name):
+    """
+    Save the current app and master levels as scene name (replacing one of the same name). Returns the scene.
+    Raises without touching the stored scenes if the levels can't be read.
+    """
+    scene = {'name': name.strip(), 'saved': time.time(), 'apps': _capture()}
+    master = volume_controller.get_master_volume()
+    if master is None:
+        raise RuntimeError("Master volume could not be read; scene not saved")
+    scene['master'] = {'volume': master['volume'], 'muted': master['muted']}
+    with _lock:
+        scenes = _load()
+        previous = scenes.get(scene['name'])
+        scenes[scene['name']] = scene
+        try:
+            _write()
+        except Exception:
+            # Keep memory in line with the file
+            if previous is None:
+                del scenes[scene['name']]
+            else:
+                scenes[scene['name']] = previous
+            raise
+    return scene
+
+
+def delete_scene(name):
+    """Delete scene name. Returns False if there was no such scene."""
+    with _lock:
+        if _load().pop(name.strip(), None) is None:
+            return False
+        _write()
+    return True
+
+
+def restore_scene(name, duration=None, curve='linear', master=True):
+    """
+    Apply scene name in one bulk pass. duration (seconds) fades volumes instead of
+    setting them; mute states switch straight away. master=False leaves the master alone.
+    Returns None if there is no such scene, else {"success", "scene", "missing": [app names],
+    "results": [bulk results]}; apps that aren't running don't count as failures.
+    """
+    scene = get_scene(name)
+    if scene is None:
+        return None
+    fade = {} if duration is None else {'duration_ms': duration * 1000, 'curve': curve}
+    ops = []
+    for app in scene['apps']:
+        ops.append({'op': 'mute' if app['muted'] else 'unmute', 'app': app['name']})
+        ops.append(dict({'op': 'set', 'app': app['name'], 'volume': app['volume']}, **fade))
+    if master and 'master' in scene:
+        ops.append({'op': 'mute' if scene['master']['muted'] else 'unmute', 'master': True})
+        ops.append(dict({'op': 'set', 'master': True, 'volume': scene['master']['volume']}, **fade))
+    results = volume_controller.apply_bulk(ops) if ops else []
+    missing = []
+    for result in results:
+        if result.get('missing') and result['app'] not in missing:
+            missing.append(result['app'])
+    return {
+        'success': all(result['success'] or result.get('missing') for result in results),
+        'scene': scene['name'],
+        'missing': missing,
+        'results': results,
+    }
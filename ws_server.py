@@ -0,0 +1,212 @@
+"""
+WebSocket command channel.
+
+Keeps one connection open per client so key and volume actions don't pay for
+a new HTTP request each time. Each message is a JSON object using the same
+action names and parameters as /api/batch steps, plus an optional "id":
+
+    {"id": 7, "action": "down", "key": "shift"}
+
+Each message gets one reply carrying the same id:
+
+    {"id": 7, "success": true, "message": "down: shift"}
+    {"id": 8, "success": false, "error": "Invalid key: nope"}
+
+Messages on one connection are handled in the order they arrive. Add
+"async": true to run a slow action as a background job instead: the reply
+then carries a "job_id" and a second message with "event": "job_done" and the
+job's status and result follows on the same connection when it finishes.
+
+{"action": "volume/subscribe"} starts pushing volume_events messages
+("event": "snapshot", then "changed") on the connection until
+{"action": "volume/unsubscribe"} or disconnect. "volume/meters/subscribe" and
+"volume/meters/unsubscribe" do the same for volume_meters peak levels.
+"""
+
+import json
+import logging
+import threading
+
+import actions
+import jobs
+import volume_controller
+import volume_events
+import volume_meters
+
+logger = logging.getLogger(__name__)
+
+# Default port for the WebSocket listener (the HTTP API uses 3000)
+DEFAULT_WS_PORT = 3001
+
+_websockets_available = False
+try:
+    from websockets.sync.server import serve
+    from websockets.exceptions import ConnectionClosed
+    _websockets_available = True
+except ImportError:
+    pass
+
+
+def is_available():
+    """Return True if the websockets package is installed."""
+    return _websockets_available
+
+
+# Streams a connection can subscribe to, and the connection-level actions for them
+# (handled here rather than in actions.py)
+STREAMS = {
+    'volume': volume_events.subscribe,
+    'volume/meters': volume_meters.subscribe,
+}
+SUBSCRIPTION_ACTIONS = tuple(f'{stream}/{verb}' for stream in STREAMS for verb in ('subscribe', 'unsubscribe'))
+
+
+def handle_message(raw, simulator, notify=None, subscriptions=None, after_reply=None):
+    """
+    Run one framed command and return the reply dict.
+    notify(payload) sends a later message on the same connection (used for async job completion).
+    subscriptions is the connection's _Subscriptions (needed for the subscribe actions).
+    after_reply is a list the caller runs once the reply is sent; async jobs start from it
+    so their job_done message can't overtake the reply carrying the job id.
+    """
+    try:
+        message = json.loads(raw)
+    except (TypeError, ValueError):
+        return {'id': None, 'success': False, 'error': 'Message must be a JSON object'}
+    if not isinstance(message, dict):
+        return {'id': None, 'success': False, 'error': 'Message must be a JSON object'}
+
+    msg_id = message.get('id')
+    if message.get('action') in SUBSCRIPTION_ACTIONS:
+        return _handle_subscription(message, msg_id, subscriptions)
+    try:
+        actions.validate(message, simulator)
+        if message.get('async') is True and notify is not None:
+            return _submit_job(message, msg_id, simulator, notify, after_reply)
+        result = actions.run(message, simulator)
+    except actions.ActionError as e:
+        return {'id': msg_id, 'success': False, 'error': str(e)}
+    except Exception as e:
+        logger.error(f"Error in websocket action {message.get('action')}: {str(e)}")
+        return {'id': msg_id, 'success': False, 'error': str(e)}
+    return dict(result, id=msg_id)
+
+
+def _submit_job(message, msg_id, simulator, notify, after_reply=None):
+    """Run a validated action as a background job and notify when it is done."""
+    def run():
+        try:
+            return actions.run(message, simulator), 200
+        except actions.ActionError as e:
+            return {'success': False, 'error': str(e)}, 400
+
+    def on_done(job):
+        notify(dict(job, id=msg_id, event='job_done', job_id=job['id']))
+
+    try:
+        job = jobs.submit(run, message['action'], on_done=on_done, start=after_reply is None)
+    except jobs.QueueFull as e:
+        return {'id': msg_id, 'success': False, 'error': str(e)}
+    if after_reply is not None:
+        after_reply.append(lambda: jobs.start(job['id']))
+    return {'id': msg_id, 'success': True, 'job_id': job['id'], 'status': job['status']}
+
+
+class _Subscriptions:
+    """Stream subscriptions of one connection, each pumped to it by a thread."""
+
+    def __init__(self, notify):
+        self.notify = notify
+        self.subscriptions = {}   # stream -> subscription
+        self._pumping = set()
+
+    def start(self, stream):
+        if stream not in self.subscriptions:
+            self.subscriptions[stream] = STREAMS[stream]()
+            self._pumping.discard(stream)
+
+    def pump(self):
+        """Start sending new subscriptions' messages (called after the subscribe reply went out)."""
+        for stream, subscription in self.subscriptions.items():
+            if stream in self._pumping:
+                continue
+            self._pumping.add(stream)
+
+            def run(subscription=subscription):
+                # notify() blocks while the client is slow; changes meanwhile merge in the subscription
+                while not subscription.closed:
+                    message = subscription.get()
+                    if message is not None:
+                        self.notify(message)
+
+            threading.Thread(target=run, daemon=True, name=f"ws-{stream.replace('/', '-')}").start()
+
+    def stop(self, stream=None):
+        """Stop one stream, or all of them."""
+        for name in [stream] if stream is not None else list(self.subscriptions):
+            subscription = self.subscriptions.pop(name, None)
+            if subscription is not None:
+                subscription.close()
+            self._pumping.discard(name)
+
+
+def _handle_subscription(message, msg_id, subscriptions):
+    if subscriptions is None:
+        return {'id': msg_id, 'success': False, 'error': 'Subscriptions need a WebSocket connection'}
+    stream, _, verb = message['action'].rpartition('/')
+    if verb == 'unsubscribe':
+        subscriptions.stop(stream)
+        return {'id': msg_id, 'success': True, 'message': 'Unsubscribed'}
+    if not volume_controller.is_available():
+        return {'id': msg_id, 'success': False, 'error': 'Volume control is not available (Windows + pycaw required)'}
+    try:
+        subscriptions.start(stream)
+    except Exception as e:
+        logger.error(f"Error subscribing to {stream} stream: {str(e)}")
+        return {'id': msg_id, 'success': False, 'error': str(e)}
+    return {'id': msg_id, 'success': True, 'message': 'Subscribed'}
+
+
+def _make_handler(simulator):
+    def handler(connection):
+        def notify(payload):
+            try:
+                connection.send(json.dumps(payload))
+            except ConnectionClosed:
+                pass
+
+        subscriptions = _Subscriptions(notify)
+        try:
+            for raw in connection:
+                after_reply = []
+                try:
+                    connection.send(json.dumps(handle_message(raw, simulator, notify, subscriptions, after_reply)))
+                finally:
+                    # Jobs run even if the reply couldn't be sent; they hold a queue slot until then
+                    for callback in after_reply:
+                        callback()
+                subscriptions.pump()
+        except ConnectionClosed:
+            pass
+        finally:
+            subscriptions.stop()
+    return handler
+
+
+def start(simulator, host='0.0.0.0', port=DEFAULT_WS_PORT):
+    """
+    Start the WebSocket listener on a daemon thread.
+    Returns the thread, or None if websockets is not installed or the port is unavailable.
+    """
+    if not _websockets_available:
+        logger.warning("websockets is not installed; WebSocket channel disabled")
+        return None
+    try:
+        # Frames are tiny; skip per-message compression to keep latency down
+        ws = serve(_make_handler(simulator), host, port, compression=None)
+    except OSError as e:
+        logger.error(f"Could not start WebSocket server on {host}:{port}: {str(e)}")
+        return None
+    thread = threading.Thread(target=ws.serve_forever, daemon=True, name='ws-server')
+    thread.start()
+    return thread